@@ -0,0 +1,93 @@
+"""Micro-benchmark: src.tools.dates.parse_date vs. dateparser.parse.
+
+Run from the repo root:
+    python -m benchmarks.bench_dates [--rounds 20]
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import sys
+import time
+
+# Strings as they show up in meta tags, <time> elements and page copy on SMB sites.
+CORPUS = [
+    "2024-03-05",
+    "2024-03-05T10:00:00Z",
+    "2024-03-05T10:00:00+00:00",
+    "2024-03-05T10:00:00.000-05:00",
+    "2023-11-28T14:32:07.123456",
+    "2024-01-15 09:30:00",
+    "Tue, 05 Mar 2024 10:00:00 GMT",
+    "Mon, 18 Dec 2023 16:45:12 +0000",
+    "Wed, 3 Jan 2024 08:00:00 -0500",
+    "March 5, 2024",
+    "Mar 5, 2024",
+    "Sept. 12th, 2023",
+    "September 12, 2023",
+    "Jan. 2, 2024",
+    "December 31st, 2023",
+    "5 March 2024",
+    "21st of June, 2024",
+    "1 Feb 2024",
+    "October 3, 2026",
+    "Nov 11 2023",
+    # fallback cases
+    "12 de marzo de 2024",
+    "03/05/2024",
+    "yesterday",
+    "2 weeks ago",
+]
+
+
+def _time(fn, items, rounds):
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for s in items:
+            fn(s)
+    return (time.perf_counter() - t0) / (rounds * len(items))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    dateparser = importlib.import_module("dateparser")
+    import_s = time.perf_counter() - t0
+
+    from src.tools.dates import _fast, _fast_cached, parse_date
+
+    def no_memo(s):
+        _fast_cached.cache_clear()  # only absolute formats are memoized
+        return parse_date(s)
+
+    print(f"corpus: {len(CORPUS)} strings x {args.rounds} rounds")
+    print(f"import dateparser: {import_s * 1000:.0f} ms")
+
+    dp = _time(dateparser.parse, CORPUS, args.rounds)
+    cold = _time(no_memo, CORPUS, args.rounds)
+    _fast_cached.cache_clear()
+    warm = _time(parse_date, CORPUS, args.rounds)
+
+    fast_only = [s for s in CORPUS if _fast(s) is not None]
+    dp_fast = _time(dateparser.parse, fast_only, args.rounds)
+    fast = _time(no_memo, fast_only, args.rounds)
+
+    print(f"{'':28}{'us/call':>10}")
+    print(f"{'dateparser.parse (all)':28}{dp * 1e6:>10.1f}")
+    print(f"{'parse_date, no memo (all)':28}{cold * 1e6:>10.1f}")
+    print(f"{'parse_date, memoized (all)':28}{warm * 1e6:>10.1f}")
+    print(f"{'dateparser.parse (fast set)':28}{dp_fast * 1e6:>10.1f}")
+    print(f"{'parse_date (fast set)':28}{fast * 1e6:>10.1f}")
+    mismatches = [
+        s for s in fast_only
+        if (d := dateparser.parse(s)) and parse_date(s).date() != d.date()
+    ]
+    if mismatches:
+        print("date mismatches vs dateparser:", mismatches, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
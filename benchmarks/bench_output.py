@@ -0,0 +1,142 @@
+"""Benchmark: serialization cost and output size per result format.
+
+Compares the original per-record path (model_dump + manual str patches +
+json.dumps + one write per line) with src.output.OutputWriter for every
+format, and times reading each file back with read_records. Records are
+generated from a seeded random mix of company names, URL paths, snippets and
+email bodies, so compressed sizes are not flattered by repeated text.
+
+Run from the repo root:
+    python -m benchmarks.bench_output [--records 20000] [--seed 7]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from src.agents.outbound import EmailDraft
+from src.output import FORMATS, OutputWriter, read_records, to_record
+from src.schemas import EvidenceCard
+
+SIGNALS = {
+    "expansion": ["grand opening", "now open", "new location", "second office", "opening soon"],
+    "scheduler": ["book online", "schedule an appointment", "request a visit", "book your next cleaning"],
+    "hiring": ["we are hiring", "join our team", "apply today", "open roles", "careers"],
+}
+# page-like filler so snippets, URLs and emails differ per record the way scraped ones do
+WORDS = """our team patients families care office clinic doctor smile dental health visit new
+downtown street avenue suite floor parking hours monday friday weekend evening morning staff
+hygienist assistant coordinator front desk insurance plans accepted welcome community years
+experience modern technology comfortable gentle same day emergency whitening implants crowns
+braces aligners pediatric family cosmetic general checkup cleaning exam xray consultation free
+spring summer fall winter this next week month today call text email online form portal
+north south east west main oak maple park center plaza village heights county city""".split()
+FIRST = ["Bright", "Smile", "Family", "Park", "River", "Oak", "Summit", "Harbor", "Elm", "Pioneer",
+         "Valley", "Sunrise", "Lakeside", "Cedar", "Metro", "Gentle", "Premier", "Coastal", "Union", "Aspen"]
+LAST = ["Dental", "Dentistry", "Smiles", "Dental Care", "Orthodontics", "Family Dental", "Dental Group",
+        "Dental Studio", "Oral Health", "Dental Arts"]
+
+
+def _words(rng: random.Random, lo: int, hi: int) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(lo, hi)))
+
+
+def _states(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    out = []
+    for i in range(n):
+        company = f"{rng.choice(FIRST)} {rng.choice(LAST)}" + (f" of {rng.choice(WORDS).title()}" if rng.random() < 0.5 else "")
+        domain = f"{company.lower().replace(' ', rng.choice(['', '-']))}{rng.randint(1, 999)}.{rng.choice(['com', 'net', 'org', 'co'])}"
+        kind = rng.choice(list(SIGNALS))
+        card = email = None
+        if rng.random() < 0.75:  # roughly the share of domains that yield a card
+            snippet = f"{_words(rng, 3, 12)} {rng.choice(SIGNALS[kind])} {_words(rng, 4, 20)}".capitalize()
+            path = "/".join(_words(rng, 1, 3).replace(" ", "-") for _ in range(rng.randint(1, 3)))
+            conf = round(rng.uniform(0.55, 0.99), 2)
+            card = EvidenceCard(signal_type=kind, canonical_url=f"https://www.{domain}/{path}",
+                                first_seen=now - timedelta(seconds=rng.randint(0, 90 * 86400)), last_seen=now,
+                                snippet=snippet, confidence=conf,
+                                explain=f"explicit_phrase; freshness={rng.uniform(0, 1):.2f}")
+            email = EmailDraft(subject=f"{rng.choice(['Congrats on', 'Saw', 'Quick idea about'])} {company}'s {_words(rng, 1, 3)}",
+                               body=f"Hi {company} team — saw this: \"{snippet}\"\n\n{_words(rng, 15, 40).capitalize()}.",
+                               call_to_action=rng.choice(["Open to a 10-minute walkthrough next week?",
+                                                          "Worth a 10-minute look this week?",
+                                                          "Open to a quick call?"]))
+        out.append(({"domain": domain, "company": company, "vertical": "dentists"},
+                    SimpleNamespace(card=card, email=email)))
+    return out
+
+
+def _legacy_record(row, final) -> dict:
+    card_data = None
+    if final.card:
+        card_data = final.card.model_dump()
+        card_data["canonical_url"] = str(card_data["canonical_url"])
+        card_data["first_seen"] = card_data["first_seen"].isoformat()
+        card_data["last_seen"] = card_data["last_seen"].isoformat()
+    email_data = final.email.model_dump() if final.email else None
+    return {"domain": row["domain"], "company": row.get("company"), "vertical": row.get("vertical"),
+            "card": card_data, "email": email_data}
+
+
+def _legacy_write(states, path) -> None:
+    with open(path, "w") as f:
+        for row, final in states:
+            f.write(json.dumps(_legacy_record(row, final)) + "\n")
+
+
+def _legacy_read(path) -> int:
+    n = 0
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                json.loads(line)
+                n += 1
+    return n
+
+
+def _writer_write(states, path) -> None:
+    with OutputWriter(path) as out:
+        for row, final in states:
+            out.write(to_record(row, final))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    states = _states(args.records, args.seed)
+
+    print(f"records: {args.records}")
+    print(f"{'':24}{'write us/rec':>14}{'read us/rec':>13}{'size kB':>10}{'B/rec':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [("legacy json.dumps", "legacy.jsonl", _legacy_write, _legacy_read)]
+        cases += [(f"OutputWriter {fmt}", f"out.{fmt}", _writer_write,
+                   lambda p: sum(1 for _ in read_records(p))) for fmt in FORMATS]
+        for name, fname, write, read in cases:
+            path = os.path.join(tmp, fname)
+            try:
+                t0 = time.perf_counter()
+                write(states, path)
+                w = time.perf_counter() - t0
+            except RuntimeError as e:  # optional dependency missing
+                print(f"{name:24}  skipped: {e}")
+                continue
+            t0 = time.perf_counter()
+            n = read(path)
+            r = time.perf_counter() - t0
+            assert n == args.records, (name, n)
+            size = os.path.getsize(path)
+            print(f"{name:24}{w / n * 1e6:>14.1f}{r / n * 1e6:>13.1f}{size / 1e3:>10.0f}{size / n:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
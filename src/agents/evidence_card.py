@@ -13,7 +13,7 @@ def build_card(signal_type, evidence_url, snippet, published_at, screenshot_path
     return EvidenceCard(
         signal_type=signal_type,
         canonical_url=evidence_url,
-        first_seen=now,
+        first_seen=first_seen,
         last_seen=now,
         snippet=snippet[:250],
         screenshot_path=screenshot_path,
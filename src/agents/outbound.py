@@ -1,10 +1,14 @@
 # In this outbound email drafting module, we define the EmailDraft model and the draft_from_card function.
 # The function uses an LLM to generate a concise email based on the provided signal information.
+# Drafter adds a no-LLM template path for clean high-confidence cards and batches the rest.
+from dataclasses import dataclass
 from pydantic import BaseModel, Field, ValidationError
-from typing import Optional
-import json
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
 import re
+from src import deadline, metrics
 from src.llm.ollama_runtime import OllamaChat
+from src.llm.structured import extract_json, schema_for
 
 
 class EmailDraft(BaseModel):
@@ -13,18 +17,34 @@ class EmailDraft(BaseModel):
     call_to_action: Optional[str] = None
 
 
-SYSTEM = """You are a concise SDR assistant.
-Return ONLY a JSON object exactly like:
-{"subject":"...", "body":"...", "call_to_action":"..."}
+class IndexedDraft(EmailDraft):
+    index: int
+
 
-Rules:
+EMAIL_FORMAT = schema_for(EmailDraft)
+BATCH_FORMAT = {"type": "array", "items": schema_for(IndexedDraft)}
+
+RULES = """Rules:
 - Subject ≤ 60 chars, specific to the signal.
 - Body: 3 short paragraphs max (<= 80 words total).
 - First line: reference the signal explicitly (what/where/when).
 - Avoid hype, no emojis, no bullet lists, no links.
 - Use the CTA verbatim if provided; otherwise write one clear ask."""
 
-TEMPLATE = """Example (style guide only):
+SYSTEM = f"""You are a concise SDR assistant.
+Return ONLY a JSON object exactly like:
+{{"subject":"...", "body":"...", "call_to_action":"..."}}
+
+{RULES}"""
+
+BATCH_SYSTEM = f"""You are a concise SDR assistant.
+You will get several numbered INPUT blocks. Write one email per INPUT.
+Return ONLY a JSON array with one object per INPUT, exactly like:
+[{{"index":0, "subject":"...", "body":"...", "call_to_action":"..."}}, ...]
+
+{RULES}"""
+
+EXAMPLE = """Example (style guide only):
 INPUT:
 Company: X
 Domain: XXX.com
@@ -33,9 +53,10 @@ Evidence URL: https://xyz.com/locations
 Snippet: "We opened a new xxx in xxx on xxx"
 Confidence: 0.72
 OUTPUT:
-{{"subject":"Congrats on your X opening","body":"Hi xxx — noticed your new xxx opened xx. \n\\nWould a 10-minute walkthrough next week be useful?","call_to_action":"Open to a 10-minute walkthrough next week?"}}
+{"subject":"Congrats on your X opening","body":"Hi xxx — noticed your new xxx opened xx. \n\\nWould a 10-minute walkthrough next week be useful?","call_to_action":"Open to a 10-minute walkthrough next week?"}"""
 
-INPUT:
+# per-card part; kept after SYSTEM + EXAMPLE so the static prefix is reused by Ollama
+TEMPLATE = """INPUT:
 Company: {company}
 Domain: {domain}
 Signal: {signal_type}
@@ -44,104 +65,221 @@ Snippet: "{snippet}"
 Confidence: {confidence}
 OUTPUT (JSON only):"""
 
+SYSTEM_PROMPT = f"{SYSTEM}\n\n{EXAMPLE}"
+BATCH_SYSTEM_PROMPT = f"{BATCH_SYSTEM}\n\n{EXAMPLE}"
+
+PLACEHOLDER = re.compile(r"\b(?:X|xxx|xx)\b", flags=re.IGNORECASE)
+
+# no-LLM drafts for cards whose snippet can be quoted as-is; {host} is the evidence site
+SIGNAL_TEMPLATES: Dict[str, Dict[str, str]] = {
+    "expansion": {
+        "subject": "Congrats on the new {company} location",
+        "body": ("Hi {company} team — saw this on {host}: \"{snippet}\"\n\n"
+                 "A new location usually means a wave of new customers to book and onboard. "
+                 "We help teams absorb that without adding front-desk hours."),
+        "call_to_action": "Open to a 10-minute walkthrough next week?",
+    },
+    "scheduler": {
+        "subject": "Quick idea for {company}'s online booking",
+        "body": ("Hi {company} team — noticed your booking flow on {host}: \"{snippet}\"\n\n"
+                 "We help teams fill more of those slots and cut no-shows with reminders "
+                 "that plug into the scheduler you already use."),
+        "call_to_action": "Worth a 10-minute look this week?",
+    },
+    "hiring": {
+        "subject": "Saw {company} is hiring",
+        "body": ("Hi {company} team — saw the opening on {host}: \"{snippet}\"\n\n"
+                 "While the role is open, we can take routine scheduling and follow-ups off "
+                 "the team's plate so new hires ramp into a calmer front desk."),
+        "call_to_action": "Open to a 10-minute call next week?",
+    },
+}
+
+
+def company_name(domain: str, company: Optional[str]) -> str:
+    """Company as given, else a guess from the domain (acme-dental.com -> Acme-Dental)."""
+    if company:
+        return company
+    host = (urlsplit(domain).hostname or domain) if "://" in domain else domain
+    return host.removeprefix("www.").split(".")[0].title()
+
+
+def _replace_placeholders(data: dict, company: str) -> dict:
+    for key in ("subject", "body", "call_to_action"):
+        if key in data and isinstance(data[key], str):
+            new_val = PLACEHOLDER.sub(company, data[key])
+            if new_val != data[key]:
+                print(f"DEBUG OUTBOUND: Replaced placeholders in '{key}': '{data[key]}' -> '{new_val}'")
+            data[key] = new_val
+    return data
+
+
+def _fallback_draft(company: str, snippet: str) -> EmailDraft:
+    metrics.incr("outbound.fallbacks")
+    return EmailDraft(
+        subject=f"Quick idea after {company or 'your'} recent update",
+        body=f"Hi {company or ''} — noticed: {snippet}\n\nWe help teams act on this signal. Open to a 10-minute walkthrough?",
+        call_to_action="Open to a 10-minute walkthrough?"
+    )
+
 
 def draft_from_card(llm: OllamaChat, *, company: str, domain: str, signal_type: str, url: str, snippet: str, confidence: float):
     user = TEMPLATE.format(company=company or "Prospect", domain=domain,
                            signal_type=signal_type, url=url, snippet=snippet, confidence=confidence)
-    messages = [{"role": "system", "content": SYSTEM},
+    messages = [{"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": user}]
 
     print(f"DEBUG OUTBOUND: Drafting email for {company}")
     print(f"DEBUG OUTBOUND: Signal: {signal_type}, Snippet: {snippet}")
 
-    out = llm.chat(messages).strip()
+    metrics.incr("outbound.runs")
+    try:
+        out = llm.chat(messages, format=EMAIL_FORMAT).strip()
+    except deadline.DeadlineExceeded as e:
+        # out of time for this domain: keep the card, send the template draft
+        print(f"DEBUG OUTBOUND: {e}")
+        out = ""
     print(f"DEBUG OUTBOUND: LLM response: {out[:200]}...")
-    
-    placeholder_pattern = re.compile(r"\b(?:X|xxx|xx)\b", flags=re.IGNORECASE)
-
-    def _replace_placeholders_in_data(data_dict: dict, company_name: str):
-        for key in ("subject", "body", "call_to_action"):
-            if key in data_dict and isinstance(data_dict[key], str):
-                new_val = placeholder_pattern.sub(company_name, data_dict[key])
-                if new_val != data_dict[key]:
-                    print(
-                        f"DEBUG OUTBOUND: Replaced placeholders in '{key}': '{data_dict[key]}' -> '{new_val}'")
-                data_dict[key] = new_val
-        return data_dict
-
-    def _sanitize_json_like_string(s: str) -> str:
-
-        out_chars = []
-        in_str = False
-        escape = False
-        for ch in s:
-            if ch == '"' and not escape:
-                in_str = not in_str
-                out_chars.append(ch)
-                continue
-            if ch == '\\' and not escape:
-                escape = True
-                out_chars.append(ch)
-                continue
-            if ch in ('\n', '\r') and in_str and not escape:
-                # replace actual newline with escaped sequence
-                out_chars.append('\\n')
-                escape = False
-                continue
-            out_chars.append(ch)
-            escape = False
-        return ''.join(out_chars)
-
-    json_match = re.search(r'\{[^{}]*"subject"[^{}]*\}', out, re.DOTALL)
-    if json_match:
-        try:
-            data = json.loads(json_match.group(0))
-            print(f"DEBUG OUTBOUND: Parsed JSON: {data}")
-            data = _replace_placeholders_in_data(data, company or "Prospect")
-            return EmailDraft.model_validate(data)
-        except (json.JSONDecodeError, ValidationError) as e:
-            print(f"DEBUG OUTBOUND: JSON parse error: {e}")
-            try:
-                sanitized = _sanitize_json_like_string(json_match.group(0))
-                print(
-                    f"DEBUG OUTBOUND: Sanitized JSON string (first 200 chars): {sanitized[:200]}")
-                data = json.loads(sanitized)
-                print(
-                    f"DEBUG OUTBOUND: Parsed JSON after sanitization: {data}")
-                data = _replace_placeholders_in_data(
-                    data, company or "Prospect")
-                return EmailDraft.model_validate(data)
-            except (json.JSONDecodeError, ValidationError) as e2:
-                print(
-                    f"DEBUG OUTBOUND: JSON parse error after sanitization: {e2}")
-
-    # fallback pattern
-    m = re.search(r"\{.*\}\s*$", out, flags=re.S)
-    if m:
+
+    data = extract_json(out, require="subject")
+    if isinstance(data, dict):
+        print(f"DEBUG OUTBOUND: Parsed JSON: {data}")
         try:
-            data = json.loads(m.group(0))
-            print(f"DEBUG OUTBOUND: Parsed JSON (fallback): {data}")
-            data = _replace_placeholders_in_data(data, company or "Prospect")
+            data = _replace_placeholders(data, company or "Prospect")
             return EmailDraft.model_validate(data)
-        except (json.JSONDecodeError, ValidationError) as e:
-            print(f"DEBUG OUTBOUND: Fallback JSON parse error: {e}")
-            try:
-                sanitized = _sanitize_json_like_string(m.group(0))
-                print(
-                    f"DEBUG OUTBOUND: Sanitized fallback JSON string (first 200 chars): {sanitized[:200]}")
-                data = json.loads(sanitized)
-                print(
-                    f"DEBUG OUTBOUND: Parsed JSON (fallback) after sanitization: {data}")
-                data = _replace_placeholders_in_data(
-                    data, company or "Prospect")
-                return EmailDraft.model_validate(data)
-            except (json.JSONDecodeError, ValidationError) as e2:
-                print(
-                    f"DEBUG OUTBOUND: Fallback JSON parse error after sanitization: {e2}")
-
- 
+        except ValidationError as e:
+            print(f"DEBUG OUTBOUND: Draft validation error: {e}")
+
+    return _fallback_draft(company, snippet)
+
+
+@dataclass
+class DraftInput:
+    """Everything a draft needs from one qualifying card (draft_from_card's keyword args)."""
+    company: str
+    domain: str
+    signal_type: str
+    url: str
+    snippet: str
+    confidence: float
+
+
+@dataclass
+class DraftConfig:
+    mode: str = "auto"                    # llm: one call per card | template: templates, else one call | auto: templates, else batched
+    template_min_confidence: float = 0.8  # below this a card always goes to the LLM
+    batch_size: int = 8                   # cards per batched LLM request
+    max_tokens_per_draft: int = 200       # num_predict for a batch is this times its size
+    templates: Optional[Dict[str, Dict[str, str]]] = None  # per-signal overrides of SIGNAL_TEMPLATES
+
+
+def render_template(inp: DraftInput, templates: Optional[Dict[str, Dict[str, str]]] = None) -> Optional[EmailDraft]:
+    """
+    Draft from the signal's template when the snippet is clean enough to quote
+    verbatim (one line, 20-200 chars, no links or placeholders); else None.
+    Templates may use {company}, {host} and {snippet}.
+    """
+    tpl = {**SIGNAL_TEMPLATES, **(templates or {})}.get(inp.signal_type)
+    snippet = " ".join((inp.snippet or "").split()).strip(" \"'")
+    if tpl is None or not 20 <= len(snippet) <= 200 or "\n" in (inp.snippet or "").strip():
+        return None
+    if "http" in snippet or "<" in snippet or "{" in snippet or PLACEHOLDER.search(snippet):
+        return None
+    host = urlsplit(inp.url).hostname or inp.domain
+    values = {"company": inp.company, "host": host.removeprefix("www."), "snippet": snippet}
     return EmailDraft(
-        subject=f"Quick idea after {company or 'your'} recent update",
-        body=f"Hi {company or ''} — noticed: {snippet}\n\nWe help teams act on this signal. Open to a 10-minute walkthrough?",
-        call_to_action="Open to a 10-minute walkthrough?"
+        subject=tpl["subject"].format(**values)[:120],
+        body=tpl["body"].format(**values),
+        call_to_action=tpl["call_to_action"],
     )
+
+
+def draft_batch(llm: OllamaChat, inputs: List[DraftInput], *, max_tokens_per_draft: int = 200) -> List[Optional[EmailDraft]]:
+    """
+    Draft several cards in one request returning a JSON array of drafts tagged
+    with their input index. Entries the model skipped or got wrong come back
+    as None so the caller can retry them one by one.
+    """
+    blocks = [f"#{i}\n" + TEMPLATE.format(company=c.company or "Prospect", domain=c.domain, signal_type=c.signal_type,
+                                          url=c.url, snippet=c.snippet, confidence=c.confidence).removesuffix("OUTPUT (JSON only):").rstrip()
+              for i, c in enumerate(inputs)]
+    messages = [{"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": "\n\n".join(blocks) + f"\n\nOUTPUT (JSON array of {len(inputs)} objects only):"}]
+
+    metrics.incr("outbound.batches")
+    metrics.incr("outbound.batched", len(inputs))
+    print(f"DEBUG OUTBOUND: Drafting batch of {len(inputs)}")
+    out = llm.chat(messages, format=BATCH_FORMAT, max_new_tokens=max_tokens_per_draft * len(inputs)).strip()
+
+    data = extract_json(out)
+    if isinstance(data, dict):  # {"emails": [...]} and similar wrappers
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    drafts: List[Optional[EmailDraft]] = [None] * len(inputs)
+    for item in data if isinstance(data, list) else []:
+        idx = item.get("index") if isinstance(item, dict) else None
+        if not isinstance(idx, int) or not 0 <= idx < len(inputs) or drafts[idx] is not None:
+            continue
+        try:
+            item = _replace_placeholders(dict(item), inputs[idx].company or "Prospect")
+            drafts[idx] = EmailDraft.model_validate(item)
+        except ValidationError as e:
+            print(f"DEBUG OUTBOUND: Batch item {idx} validation error: {e.error_count()} errors")
+    missing = sum(d is None for d in drafts)
+    if missing:
+        metrics.incr("outbound.batch_misses", missing)
+    return drafts
+
+
+class Drafter:
+    """
+    Outbound drafting policy shared by the graph and the batch runner.
+
+        draft(inp)        -> one draft, template if eligible, else one LLM call
+        draft_many(inps)  -> templates where eligible, the rest in batched LLM calls
+        template(inp)     -> the template draft, or None if the card must go to the LLM
+
+    Batch items the model drops are retried with draft_from_card, which falls
+    back to a fixed template if parsing still fails.
+    """
+
+    def __init__(self, llm: OllamaChat, cfg: Optional[DraftConfig] = None):
+        self.llm = llm
+        self.cfg = cfg or DraftConfig()
+
+    @property
+    def batching(self) -> bool:
+        return self.cfg.mode == "auto" and self.cfg.batch_size > 1
+
+    def template(self, inp: DraftInput) -> Optional[EmailDraft]:
+        if self.cfg.mode == "llm" or inp.confidence < self.cfg.template_min_confidence:
+            return None
+        draft = render_template(inp, self.cfg.templates)
+        if draft is not None:
+            metrics.incr("outbound.templated")
+        return draft
+
+    def _single(self, inp: DraftInput) -> EmailDraft:
+        return draft_from_card(self.llm, company=inp.company, domain=inp.domain, signal_type=inp.signal_type,
+                               url=inp.url, snippet=inp.snippet, confidence=inp.confidence)
+
+    def draft(self, inp: DraftInput) -> EmailDraft:
+        return self.template(inp) or self._single(inp)
+
+    def draft_many(self, inputs: List[DraftInput]) -> List[EmailDraft]:
+        drafts: List[Optional[EmailDraft]] = [self.template(c) for c in inputs]
+        todo = [i for i, d in enumerate(drafts) if d is None]
+        if not self.batching:
+            for i in todo:
+                drafts[i] = self._single(inputs[i])
+            return drafts  # type: ignore[return-value]
+        size = self.cfg.batch_size
+        for start in range(0, len(todo), size):
+            chunk = todo[start:start + size]
+            try:
+                got = draft_batch(self.llm, [inputs[i] for i in chunk], max_tokens_per_draft=self.cfg.max_tokens_per_draft)
+            except Exception as e:
+                print(f"DEBUG OUTBOUND: batch failed ({e}); drafting one by one")
+                got = [None] * len(chunk)
+            for i, d in zip(chunk, got):
+                drafts[i] = d if d is not None else self._single(inputs[i])
+        return drafts  # type: ignore[return-value]
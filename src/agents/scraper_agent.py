@@ -1,12 +1,17 @@
 #Scraper agent where agent interacts with the web to fetch pages in given modules in csv file.
 
-from pydantic import ValidationError
+from src import deadline, metrics
 from src.llm.ollama_runtime import OllamaChat
+from src.llm.structured import iter_json_spans, parse_model, schema_for
 
-from src.agents.tools_protocol import TOOLS_SPEC, execute_tool
-import json, re
+from src.agents.tools_protocol import TOOLS_SPEC, TOOL_CALL_SCHEMA, execute_tool
+import json
 from typing import List
 from src.schemas import ScrapeResult
+from src.tools.pages import compact_page
+
+# what the model may return; `docs` is filled in by us, never by the model
+SCRAPE_RESULT_SCHEMA = schema_for(ScrapeResult, exclude=("docs",))
 
 SYSTEM = f"""
 You are a data collection assistant. You MUST use the provided tools to fetch web pages.
@@ -17,7 +22,7 @@ Available tools:
 {TOOLS_SPEC}
 
 Return FINAL JSON matching this schema exactly:
-{ScrapeResult.model_json_schema()}
+{SCRAPE_RESULT_SCHEMA}
 
 EXAMPLES OF CORRECT TOOL USAGE:
 1. To fetch a page: {{"tool": "fetch", "args": {{"url": "https://example.com/"}}}}
@@ -34,11 +39,7 @@ Instructions:
 DO NOT write code, JavaScript, or explanations. Just call the tools and return JSON.
 """
 
-def _try_json(line: str):
-    try: 
-        return json.loads(line.strip())
-    except: 
-        return None
+SCRAPE_FORMAT = {"anyOf": [TOOL_CALL_SCHEMA, SCRAPE_RESULT_SCHEMA]}
 
 def run_scraper_agent(domain: str, candidate_paths: List[str], *, llm: OllamaChat, step_limit=5) -> ScrapeResult:
 
@@ -52,98 +53,81 @@ def run_scraper_agent(domain: str, candidate_paths: List[str], *, llm: OllamaCha
     ]
 
     print(f"DEBUG: Starting scraper for domain: {domain}")
+    metrics.incr("scraper.runs")
     
-    # Store fetched data locally
-    pages = {}
+    # Store fetched data locally; only compact docs are kept, the HTML goes to the blob store
+    docs = {}
     urls = {}
+    why = []
     
     for i in range(step_limit):
+        if deadline.expired():
+            print(f"DEBUG: Domain budget exhausted after {i} steps")
+            metrics.incr("scraper.deadline_exceeded")
+            why.append("deadline_exceeded")
+            break
         try:
             print(f"DEBUG: Step {i+1}, calling LLM...")
-            out = llm.chat(messages).strip()
+            out = llm.chat(messages, format=SCRAPE_FORMAT).strip()
             print(f"DEBUG: LLM response length: {len(out)}")
             print(f"DEBUG: LLM response: {out[:200]}...")
         except Exception as e:
             print(f"DEBUG: LLM error: {str(e)}")
             messages.append({"role":"assistant","content":f"LLM error: {str(e)}"})
+            metrics.incr("scraper.llm_errors")
             continue
         
         if not out:
             print("DEBUG: Empty response from LLM")
             messages.append({"role":"assistant","content":"Empty response"})
+            metrics.incr("scraper.retries")
             continue
             
         try:
-            lines = out.splitlines()
-            if not lines:
-                print("DEBUG: No lines in response")
-                messages.append({"role":"assistant","content":"No lines in response"})
-                continue
-                
-  
+            # one scan picks up every tool call, whether newline- or ';'-separated
             tool_found = False
-            for line in lines:
+            for span in iter_json_spans(out):
+                try:
+                    maybe = json.loads(span)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(maybe, dict) and "tool" in maybe:
+                    print(f"DEBUG: Tool call detected: {maybe}")
+                    result = execute_tool(maybe)
                 
-                if ';' in line:
-                    tool_calls = line.split(';')
-                    for tool_call in tool_calls:
-                        maybe = _try_json(tool_call.strip())
-                        if isinstance(maybe, dict) and "tool" in maybe:
-                            print(f"DEBUG: Tool call detected: {maybe}")
-                            result = execute_tool(maybe)
-                            print(f"DEBUG: Tool result: {result}")
-                        
-                            if result.get("ok") and "data" in result:
-                                if maybe["tool"] == "fetch":
-                                    url = maybe["args"]["url"]
-                                    path = url.replace(domain, "")
-                                    if not path:
-                                        path = "/"
-                                    pages[path] = result["data"]
-                                    urls[path] = url
-                                    print(f"DEBUG: Stored page for path {path}")
-                            
-                            messages.append({"role":"assistant","content": json.dumps(maybe)})
-                            messages.append({"role":"tool","content":json.dumps({"tool_result": result})})
-                            tool_found = True
-                else:
-                    maybe = _try_json(line)
-                    if isinstance(maybe, dict) and "tool" in maybe:
-                        print(f"DEBUG: Tool call detected: {maybe}")
-                        result = execute_tool(maybe)
-                        print(f"DEBUG: Tool result: {result}")
-                        
-                        # Store the result
-                        if result.get("ok") and "data" in result:
-                            if maybe["tool"] == "fetch":
-                                url = maybe["args"]["url"]
-                                path = url.replace(domain, "")
-                                if not path:
-                                    path = "/"
-                                pages[path] = result["data"]
-                                urls[path] = url
-                                print(f"DEBUG: Stored page for path {path}")
-                        
-                        messages.append({"role":"assistant","content": json.dumps(maybe)})
-                        messages.append({"role":"tool","content":json.dumps({"tool_result": result})})
-                        tool_found = True
-                        break
+                    if result.get("ok") and "data" in result:
+                        if maybe["tool"] == "fetch":
+                            url = maybe["args"]["url"]
+                            path = url.replace(domain, "")
+                            if not path:
+                                path = "/"
+                            doc = compact_page(result["data"], url)
+                            docs[path] = doc
+                            urls[path] = url
+                            # the model gets a short summary instead of the page HTML
+                            result = {"ok": True, "data": {"path": path, "blob_id": doc.blob_id,
+                                                           "chars": len(doc.text), "excerpt": doc.text[:300]}}
+                            print(f"DEBUG: Stored page for path {path}")
+                    print(f"DEBUG: Tool result: {str(result)[:300]}")
+                    
+                    messages.append({"role":"assistant","content": json.dumps(maybe)})
+                    messages.append({"role":"tool","content":json.dumps({"tool_result": result})})
+                    tool_found = True
                     
             if tool_found:
                 continue
                 
-            m = re.search(r"\{.*\}\s*$", out, flags=re.S)
-            if m:
-                try:
-                    print(f"DEBUG: Found JSON, validating...")
-                    result = ScrapeResult.model_validate_json(m.group(0))
-                    print(f"DEBUG: Valid result: {result}")
-                    return result
-                except ValidationError as e:
-                    print(f"DEBUG: Validation error: {e}")
-                    messages.append({"role":"assistant","content":out});
-                    continue
+            final = parse_model(out, ScrapeResult, require="ok")
+            if final is not None:
+                print(f"DEBUG: Valid result: {final}")
+                # the model rarely echoes page HTML back; keep what the tools actually fetched
+                for path, html in final.pages.items():
+                    docs.setdefault(path, compact_page(html, urls.get(path)))
+                if docs:
+                    final = ScrapeResult(ok=True, why=final.why, urls={**final.urls, **urls}, docs=docs)
+                return final
                     
+            metrics.incr("scraper.retries")
             messages.append({"role":"assistant", "content": out})
         except Exception as e:
             print(f"DEBUG: Processing error: {str(e)}")
@@ -151,13 +135,13 @@ def run_scraper_agent(domain: str, candidate_paths: List[str], *, llm: OllamaCha
             continue
             
 
-    print(f"DEBUG: Final check - pages collected: {len(pages)}")
-    print(f"DEBUG: Pages: {list(pages.keys())}")
+    print(f"DEBUG: Final check - pages collected: {len(docs)}")
+    print(f"DEBUG: Pages: {list(docs.keys())}")
     print(f"DEBUG: URLs: {list(urls.keys())}")
     
-    if pages:
-        print(f"DEBUG: Returning collected data: {len(pages)} pages")
-        return ScrapeResult(ok=True, why=[], pages=pages, urls=urls)
+    if docs:
+        print(f"DEBUG: Returning collected data: {len(docs)} pages")
+        return ScrapeResult(ok=True, why=why, urls=urls, docs=docs)
     else:
         print("DEBUG: No data collected")
-        return ScrapeResult(ok=False, why=["no_data_collected"])
\ No newline at end of file
+        return ScrapeResult(ok=False, why=why or ["no_data_collected"])
\ No newline at end of file
@@ -1,5 +1,7 @@
 # Tools protocol
 from typing import Dict, Any
+from src import profiling
+from src.patterns import compile_any
 from src.tools.web import fetch
 from src.tools.web import extract_text, sentences
 from src.tools.web import extract_date as get_meta_dates
@@ -13,7 +15,21 @@ Emit a single JSON object to call a tool:
 {"tool": "get_meta_dates", "args": {"html": "<html>..."}}
 """
 
+# JSON schema of a single tool call, used to constrain agent output
+TOOL_CALL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tool": {"type": "string", "enum": ["fetch", "extract_text", "find_matches", "get_meta_dates"]},
+        "args": {"type": "object"},
+    },
+    "required": ["tool", "args"],
+}
+
 def execute_tool(call: Dict[str, Any]) -> Dict[str, Any]:
+    with profiling.stage(f"tool.{call.get('tool')}"):
+        return _execute_tool(call)
+
+def _execute_tool(call: Dict[str, Any]) -> Dict[str, Any]:
     name = call.get("tool")
     args = call.get("args", {})
     try:
@@ -23,8 +39,7 @@ def execute_tool(call: Dict[str, Any]) -> Dict[str, Any]:
             text = extract_text(args["html"]); return {"ok": True, "data": text}
         elif name == "find_matches":
             text = args["text"]; patterns = args.get("patterns", []); max_sent = int(args.get("max_sentences", 10))
-            import re
-            rx = re.compile("|".join(patterns), re.I) if patterns else None
+            rx = compile_any(tuple(patterns))  # cached: agents send the same phrase lists for every page
             outs = []
             for s in sentences(text):
                 if not s.strip(): continue
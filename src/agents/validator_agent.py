@@ -1,9 +1,12 @@
-import json, re
-from typing import Dict, List
-from pydantic import ValidationError
+from typing import Dict
+from src import deadline, metrics
 from src.llm.ollama_runtime import OllamaChat
-from src.schemas import ValidateResult
-from src.tools.web import extract_text
+from src.llm.structured import parse_model, schema_for
+from src.patterns import VerticalPatterns
+from src.schemas import PageDoc, ValidateResult
+from src.tools.web import sentences
+
+PAGE_CHARS = 2000  # text per page in the prompt
 
 SYSTEM = f"""
 You are a verification agent. You will receive text content from web pages.
@@ -24,109 +27,84 @@ Example response:
 {{"ok": true, "signal_type": "expansion", "evidence_url": "http://example.com/", "snippet": "We are excited to announce our new location opening", "published_at": null, "confidence": 0.8, "why": []}}
 """
 
+VALIDATE_FORMAT = schema_for(ValidateResult)
+
+def system_prompt(hints: str) -> str:
+    """System message for one vertical's hints; identical bytes across its domains (and warm-up) keep the prefix cached."""
+    return f"{SYSTEM}\nSignal hints: {hints}\n"
+
+def condense(text: str, patterns: VerticalPatterns, limit: int = PAGE_CHARS) -> str:
+    """
+    Page text for the prompt: all of it when short, else the first half of the
+    budget plus later sentences that match one of the vertical's signal
+    phrases, so a signal deep in a long page is not cut off.
+    """
+    if len(text) <= limit:
+        return text
+    out = text[: limit // 2]
+    for s in sentences(text[limit // 2:]):
+        s = s.strip()
+        if not s or not patterns.signals_in(s):
+            continue
+        if len(out) + len(s) + 5 > limit:
+            break
+        out += " ... " + s
+    return out
+
 def run_validator_agent(
     domain: str,
-    pages: Dict[str, str],
+    docs: Dict[str, PageDoc],
     urls: Dict[str, str],
-    patterns: Dict[str, List[str]],
+    patterns: VerticalPatterns,
     *,
     llm: OllamaChat,
     step_limit=4
 ) -> ValidateResult:
     print(f"DEBUG VALIDATOR: Starting validation for {domain}")
-    print(f"DEBUG VALIDATOR: Pages available: {list(pages.keys())}")
-    print(f"DEBUG VALIDATOR: Patterns: {patterns}")
+    print(f"DEBUG VALIDATOR: Pages available: {list(docs.keys())}")
+    print(f"DEBUG VALIDATOR: Patterns ({patterns.name}): {patterns.phrases}")
+    metrics.incr("validator.runs")
     
-    # Extracting text from HTML pages
-    text_pages = {}
-    for path, html in pages.items():
-        try:
-            text = extract_text(html)
-            text_pages[path] = text
-            print(f"DEBUG VALIDATOR: Extracted text for {path}: {text[:100]}...")
-        except Exception as e:
-            print(f"DEBUG VALIDATOR: Error extracting text from {path}: {e}")
-            text_pages[path] = html  
+    # text was extracted once at scrape time; the HTML itself is not kept in state
+    text_pages = {path: doc.text for path, doc in docs.items()}
     
-    hints = json.dumps(patterns, indent=2)
-    pages_condensed = "\n".join([f"PATH: {p}\nTEXT:\n{text_pages[p][:2000]}" for p in text_pages])  
+    pages_condensed = "\n".join([f"PATH: {p}\nTEXT:\n{condense(text_pages[p], patterns)}" for p in text_pages])
     
+    # static system + per-vertical hints first so Ollama can reuse the cached prefix across domains
     messages = [
-        {"role":"system","content":SYSTEM},
+        {"role":"system","content":system_prompt(patterns.hints)},
         {"role":"user","content":(
             f"Domain: {domain}\n"
             f"URL map: {urls}\n"
-            f"Signal hints: {hints}\n"
             f"Text content:\n{pages_condensed}\n"
             "Find the strongest signal and return ONLY the final JSON result."
         )}
     ]
     
     for i in range(step_limit):
+        if deadline.expired():
+            print("DEBUG VALIDATOR: Domain budget exhausted")
+            metrics.incr("validator.deadline_exceeded")
+            return ValidateResult(ok=False, why=["deadline_exceeded"])
         print(f"DEBUG VALIDATOR: Step {i+1}")
         try:
-            out = llm.chat(messages).strip()
+            out = llm.chat(messages, format=VALIDATE_FORMAT).strip()
             print(f"DEBUG VALIDATOR: LLM response: {out[:200]}...")
         except Exception as e:
             print(f"DEBUG VALIDATOR: LLM error: {e}")
             messages.append({"role":"assistant","content":f"LLM error: {str(e)}"})
+            metrics.incr("validator.llm_errors")
             continue
             
-        clean = out.strip()
-        if clean.startswith("```"):
-            # Peel off common markdown fences before extracting JSON payload
-            parts = [part.strip() for part in clean.split("```") if part.strip()]
-            json_chunks = [chunk for chunk in parts if chunk.startswith("{") and "}" in chunk]
-            if json_chunks:
-                clean = json_chunks[0]
-
-        def _iter_json_candidates(text: str):
-            if text.startswith("{") and text.endswith("}"):
-                yield text
-            for match in re.finditer(r'"ok"\s*:', text):
-                brace_start = text.rfind("{", 0, match.start())
-                if brace_start == -1:
-                    continue
-                depth = 0
-                in_string = False
-                escape = False
-                for idx in range(brace_start, len(text)):
-                    ch = text[idx]
-                    if in_string:
-                        if escape:
-                            escape = False
-                        elif ch == "\\":
-                            escape = True
-                        elif ch == '"':
-                            in_string = False
-                        continue
-                    else:
-                        if ch == '"':
-                            in_string = True
-                        elif ch == "{":
-                            depth += 1
-                        elif ch == "}":
-                            depth -= 1
-                            if depth == 0:
-                                yield text[brace_start:idx+1]
-                                break
-
-        tried = set()
-        for candidate in _iter_json_candidates(clean):
-            if candidate in tried:
-                continue
-            tried.add(candidate)
-            if '"ok"' not in candidate:
-                continue
-            try:
-                result = ValidateResult.model_validate_json(candidate)
-                print(f"DEBUG VALIDATOR: Valid result: {result}")
-                return result
-            except ValidationError as e:
-                print(f"DEBUG VALIDATOR: Validation error for candidate: {e}")
+        result = parse_model(out, ValidateResult, require="ok")
+        if result is not None:
+            print(f"DEBUG VALIDATOR: Valid result: {result}")
+            return result
 
+        metrics.incr("validator.retries")
         messages.append({"role":"assistant","content":out})
         messages.append({"role":"user","content":"Please respond with ONLY the final JSON object matching the schema ({\"ok\": ..., \"signal_type\": ..., ...})."})
     
     print("DEBUG VALIDATOR: Step limit exceeded")
+    metrics.incr("validator.exhausted")
     return ValidateResult(ok=False, why=["step_limit_exceeded"])
@@ -1,60 +1,354 @@
 # CLI entry
-import argparse, json, csv, sys, yaml
-from pathlib import Path
-from src.graph import make_graph, NodeState
+import argparse, csv, os, socket, subprocess, sys, threading, time, uuid, yaml
+from concurrent.futures import ThreadPoolExecutor
+from src import deadline, metrics
+from src.agents.outbound import DraftInput, Drafter, company_name
+from src.graph import make_drafter, make_graph, NodeState
+from src.output import OutputWriter, to_record
+from src.profiling import StageProfiler
+from src.scheduler import DomainHistory, ScheduleConfig, prioritize
+from src.tools import hostcache, httpcache
+from src.tools.web import configure_fetch, probe
+from src.watch import WatchConfig, WatchState, card_key
+from src.workqueue import WorkQueue
 
-def run_from_csv(csv_path: str, out: str, vertical: str):
-    vconf_path = f"configs/verticals/{vertical}.yml"
-    vertical_config = {}
+def _load_schedule(config_path: str = "configs/config.yml") -> dict:
+    with open(config_path) as f:
+        return (yaml.safe_load(f) or {}).get("schedule") or {}
+
+def schedule_setup(domain_budget: float | None) -> tuple[DomainHistory, ScheduleConfig, float | None]:
+    """History store, scoring knobs and per-domain budget (--domain-budget overrides the config)."""
+    sched = _load_schedule()
+    cfg = ScheduleConfig(**{k: float(sched[k]) for k in ("prior_weight", "refresh_days", "default_cost_s",
+                                                          "default_confidence") if k in sched})
+    budget_s = domain_budget if domain_budget is not None else sched.get("domain_budget_s")
+    return DomainHistory(sched.get("history")), cfg, (float(budget_s) if budget_s else None)
+
+def run_row(graph, row: dict, *, vertical: str | None = None, history: DomainHistory | None = None,
+            budget_s: float | None = None) -> dict:
+    """Output record for one domain (run_state without the final state)."""
+    return run_state(graph, row, vertical=vertical, history=history, budget_s=budget_s)[0]
+
+def run_state(graph, row: dict, *, vertical: str | None = None, history: DomainHistory | None = None,
+              budget_s: float | None = None) -> tuple[dict, NodeState]:
+    """Run one domain through the graph; returns the output record and the final state."""
+    state = NodeState(domain=row["domain"])
+    state.company = row.get("company")
+    state.vertical = row.get("vertical") or vertical
+    t0 = time.perf_counter()
+    # agents stop at their next step and network timeouts shrink once the budget runs out
+    with deadline.budget(budget_s) as b:
+        final_dict = graph.invoke(state)
+    elapsed = time.perf_counter() - t0
+    final = NodeState(**final_dict)
+    partial = bool(b and b.tripped)
+    metrics.gauge_max("state.max_kb", len(final.model_dump_json()) / 1024)
+    metrics.observe("domain.elapsed", elapsed)
+    if partial:
+        metrics.incr("domain.partial")
+    if final.card:
+        metrics.incr("signals.found")
+    if history is not None:
+        history.record(row["domain"], vertical=row.get("vertical") or vertical, hit=final.card is not None,
+                       confidence=final.card.confidence if final.card else 0.0, elapsed_s=elapsed, partial=partial)
+    record = to_record(row, final)
+    record["partial"] = partial
+    record["elapsed_s"] = round(elapsed, 2)
+    if final.draft_pending:
+        record["draft_pending"] = True  # consumed by fill_drafts
+    return record, final
+
+def fill_drafts(drafter: Drafter | None, records: list[dict]) -> None:
+    """Write the emails the graph deferred, batching them into as few LLM calls as possible."""
+    pending = [r for r in records if r.pop("draft_pending", False)]
+    if not pending or drafter is None:
+        return
+    inputs = [DraftInput(company=company_name(r["domain"], r.get("company")), domain=r["domain"],
+                         signal_type=r["card"]["signal_type"], url=r["card"]["canonical_url"],
+                         snippet=r["card"]["snippet"], confidence=r["card"]["confidence"]) for r in pending]
+    for r, draft in zip(pending, drafter.draft_many(inputs)):
+        r["email"] = draft.model_dump()
+
+def _make_profiler(args: argparse.Namespace) -> StageProfiler | None:
+    if not args.profile:
+        return None
+    return StageProfiler(args.profile, sample_rate=args.profile_sample, top_n=args.profile_top,
+                         trace_memory=not args.profile_no_mem)
+
+def _finish_run(workers: int, profiler: StageProfiler | None = None, history: DomainHistory | None = None,
+                started: float | None = None) -> None:
+    if profiler is not None:
+        print(f"Profile report: {profiler.write()}")
+    hostcache.save()
+    httpcache.save()
+    if history is not None:
+        history.save()
+    snap = metrics.snapshot()
+    found = snap["counters"].get("signals.found", 0)
+    compute_s = snap["timings"].get("domain.elapsed", {}).get("total_s", 0)
+    if compute_s:
+        metrics.gauge("signals.per_compute_hour", found / (compute_s / 3600))
+    if started is not None:
+        metrics.gauge("signals.per_wall_hour", found / (max(1e-9, time.perf_counter() - started) / 3600))
+    peak = metrics.peak_rss_mb()
+    metrics.gauge("rss.peak_mb", peak)
+    metrics.gauge("rss.peak_mb_per_worker", peak / max(1, workers))
+    print("Run metrics:\n" + metrics.report())
+
+def run_from_csv(csv_path: str, out: str, vertical: str, workers: int = 1,
+                 profiler: StageProfiler | None = None, *, prioritized: bool = False,
+                 domain_budget: float | None = None):
+    started = time.perf_counter()
+    history, sched_cfg, budget_s = schedule_setup(domain_budget)
+    drafter = make_drafter()
+    graph = make_graph(vertical=vertical, profiler=profiler, drafter=drafter)
+    batch = drafter.cfg.batch_size if drafter else 1
+
+    # domains run concurrently; LLM calls are throttled by each role's adaptive limiter
+    with open(csv_path) as f, OutputWriter(out) as writer, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        rows = csv.DictReader(f)
+        if prioritized:
+            # best expected yield first, so a run cut short by its window loses the least
+            rows = prioritize(rows, history, default_vertical=vertical, cfg=sched_cfg)
+        run = lambda row: run_row(graph, row, vertical=vertical, history=history, budget_s=budget_s)
+        # records wait (in order) until `batch` of them need an LLM draft, then go out together
+        held, pending = [], 0
+        for record in pool.map(run, rows):
+            held.append(record)
+            pending += bool(record.get("draft_pending"))
+            if pending and pending < batch:
+                continue
+            fill_drafts(drafter, held)
+            writer.write_many(held)
+            held, pending = [], 0
+        fill_drafts(drafter, held)
+        writer.write_many(held)
+    _finish_run(workers, profiler, history, started)
+
+# ---- watch mode: revisit domains on adaptive intervals ----
+
+def _watch_config(config_path: str = "configs/config.yml") -> WatchConfig:
+    with open(config_path) as f:
+        block = (yaml.safe_load(f) or {}).get("watch") or {}
+    return WatchConfig(**{k: v for k, v in block.items() if k in WatchConfig.__dataclass_fields__})
+
+def run_watch(csv_path: str | None, out: str, vertical: str, *, workers: int = 1, once: bool = False,
+              profiler: StageProfiler | None = None, domain_budget: float | None = None) -> None:
+    """
+    Keep revisiting watched domains until interrupted (or for one pass with once=True).
+
+    A visit first probes the pages the last full run fetched; conditional
+    requests make an unchanged page a 304. Only when something changed (or
+    nothing is known yet) does the domain go through the graph, and only new
+    or updated cards are appended to `out`.
+    """
+    started = time.perf_counter()
+    wcfg = _watch_config()
+    watched = WatchState(wcfg)
+    if csv_path:
+        with open(csv_path) as f:
+            print(f"WATCH: added {watched.add(csv.DictReader(f))} new domains ({len(watched)} watched)")
+    history, _, budget_s = schedule_setup(domain_budget)
+    drafter = make_drafter()
+    graph = make_graph(vertical=vertical, profiler=profiler, drafter=drafter)
+    configure_fetch(requests_per_hour=wcfg.requests_per_hour)
+
+    def _visit(domain: str) -> dict | None:
+        entry = watched.entry(domain)
+        changed = None
+        if entry["urls"]:
+            seen = [probe(u) for u in entry["urls"]]
+            metrics.incr("watch.probes", len(seen))
+            if seen and all(v is False for v in seen):
+                metrics.incr("watch.unchanged")
+                watched.record_visit(domain, changed=False)
+                return None
+            changed = any(seen) or None
+        try:
+            record, final = run_state(graph, entry["row"], vertical=vertical, history=history, budget_s=budget_s)
+        except Exception as e:
+            print(f"WATCH: {domain} failed: {e}")
+            metrics.incr("watch.errors")
+            watched.record_visit(domain, changed=None)
+            return None
+        urls = [str(u) for u in final.scrape_result.urls.values()] if final.scrape_result else []
+        key = card_key(record["card"])
+        new_card = key is not None and key != entry["card_key"]
+        watched.record_visit(domain, changed=changed, new_card=new_card, urls=urls, key=key)
+        metrics.incr("watch.runs")
+        if new_card:
+            metrics.incr("watch.new_cards")
+            return record
+        record.pop("draft_pending", None)
+        return None
+
+    with OutputWriter(out, append=True, buffer_records=1) as writer, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        try:
+            while True:
+                due = watched.due(limit=wcfg.batch)
+                if due:
+                    cards = [r for r in pool.map(_visit, due) if r is not None]
+                    fill_drafts(drafter, cards)
+                    writer.write_many(cards)
+                    watched.save(); history.save(); hostcache.save(); httpcache.save()
+                    print(f"WATCH: visited {len(due)} domains, {len(cards)} new/updated cards")
+                    continue
+                if once:
+                    break
+                wake = watched.next_wakeup()
+                time.sleep(wcfg.poll_s if wake is None else min(wcfg.poll_s, max(1.0, wake - time.time())))
+        except KeyboardInterrupt:
+            print("WATCH: interrupted, saving state")
+    watched.save()
+    _finish_run(workers, profiler, history, started)
+
+# ---- distributed mode: shared SQLite work queue ----
+
+def enqueue_csv(queue_path: str, csv_path: str, *, prioritized: bool = False, vertical: str | None = None) -> int:
+    """Jobs are claimed in enqueue order, so prioritizing here orders the whole fleet's work."""
+    with open(csv_path) as f:
+        rows = csv.DictReader(f)
+        if prioritized:
+            history, sched_cfg, _ = schedule_setup(None)
+            rows = prioritize(rows, history, default_vertical=vertical, cfg=sched_cfg)
+        added = WorkQueue(queue_path).enqueue(rows)
+    print(f"Enqueued {added} new domains into {queue_path}")
+    return added
+
+def run_queue_worker(queue_path: str, vertical: str, *, workers: int = 1, batch: int = 8,
+                     lease_s: float = 900, node_id: str | None = None, poll_s: float = 5.0,
+                     profiler: StageProfiler | None = None, domain_budget: float | None = None) -> None:
+    """Claim batches until the queue is drained, heartbeating leases from a background thread."""
+    started = time.perf_counter()
+    history, _, budget_s = schedule_setup(domain_budget)
+    q = WorkQueue(queue_path)
+    # unique per process: a restarted node reusing its --node-id must not inherit (or renew) the old leases
+    owner = f"{node_id or socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    drafter = make_drafter()
+    graph = make_graph(vertical=vertical, profiler=profiler, drafter=drafter)
+    stop = threading.Event()
+    held: set = set()  # job ids claimed and not yet completed/failed; only these are heartbeated
+    held_lock = threading.Lock()
+
+    def _heartbeat():
+        while not stop.wait(lease_s / 3):
+            with held_lock:
+                ids = list(held)
+            if ids:
+                q.heartbeat(owner, ids, lease_s)
+
+    def _job(job):
+        jid, row = job
+        try:
+            return jid, row, run_row(graph, row, vertical=vertical, history=history, budget_s=budget_s)
+        except Exception as e:
+            print(f"WORKER {owner}: {row['domain']} failed: {e}")
+            q.fail(jid, owner, repr(e))
+            with held_lock:
+                held.discard(jid)
+            return None
+
+    threading.Thread(target=_heartbeat, daemon=True).start()
     try:
-        with open(vconf_path) as f:
-            vertical_config = yaml.safe_load(f) or {}
-    except FileNotFoundError:
-        pass
-
-    graph = make_graph(vertical_config=vertical_config)
-    outp = Path(out); outp.parent.mkdir(parents=True, exist_ok=True)
-    with open(csv_path) as f, open(out, "w") as f_out:
-        rdr = csv.DictReader(f)
-        for row in rdr:
-            state = NodeState(domain=row["domain"])
-            state.company = row.get("company")
-            final_dict = graph.invoke(state)
-            final = NodeState(**final_dict)
-            
-            
-            card_data = None
-            if final.card:
-                card_data = final.card.model_dump()
-                if 'canonical_url' in card_data:
-                    card_data['canonical_url'] = str(card_data['canonical_url'])
-                if 'first_seen' in card_data:
-                    card_data['first_seen'] = card_data['first_seen'].isoformat()
-                if 'last_seen' in card_data:
-                    card_data['last_seen'] = card_data['last_seen'].isoformat()
-            
-            email_data = None
-            if final.email:
-                email_data = final.email.model_dump()
-            
-            record = {
-                "domain": row["domain"],
-                "company": row.get("company"),
-                "vertical": row.get("vertical"),
-                "card": card_data,
-                "email": email_data
-            }
-            f_out.write(json.dumps(record) + "\n")
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while True:
+                jobs = q.claim(owner, batch, lease_s)
+                if not jobs:
+                    st = q.stats()
+                    if not st.get("pending") and not st.get("leased"):
+                        break
+                    time.sleep(poll_s)  # others hold leases that may still expire back to us
+                    continue
+                with held_lock:
+                    held.update(jid for jid, _ in jobs)
+                print(f"WORKER {owner}: claimed {len(jobs)} jobs")
+                done = [d for d in pool.map(_job, jobs) if d is not None]
+                # emails deferred by the graph are drafted across the whole claimed batch
+                fill_drafts(drafter, [record for _, _, record in done])
+                for jid, row, record in done:
+                    if not q.complete(jid, owner, record):
+                        print(f"WORKER {owner}: lease on {row['domain']} was lost; result discarded")
+                    with held_lock:
+                        held.discard(jid)
+    finally:
+        stop.set()
+    _finish_run(workers, profiler, history, started)
+
+def merge_queue(queue_path: str, out: str) -> int:
+    q = WorkQueue(queue_path)
+    with OutputWriter(out) as writer:
+        writer.write_many(q.results())
+    print(f"Merged {writer.records} records into {out}; queue status: {q.stats()}")
+    return writer.records
+
+def spawn_local_nodes(queue_path: str, n: int, args: argparse.Namespace) -> None:
+    """Simulate n nodes with local worker processes sharing the queue file."""
+    cmd = [sys.executable, "-m", "src.app", "--queue", queue_path, "--worker",
+           "--vertical", args.vertical, "--workers", str(args.workers),
+           "--batch", str(args.batch), "--lease", str(args.lease)]
+    if args.domain_budget is not None:
+        cmd += ["--domain-budget", str(args.domain_budget)]
+    procs = [subprocess.Popen(cmd + ["--node-id", f"local-{i}"]) for i in range(n)]
+    codes = [p.wait() for p in procs]
+    print(f"Local nodes exited with {codes}")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", help="path to domains CSV")
-    ap.add_argument("--out", default="data/cards_and_emails.jsonl")
+    ap.add_argument("--out", default="data/cards_and_emails.jsonl",
+                    help="results file; .jsonl.gz / .jsonl.zst compress it, .parquet writes a columnar table")
     ap.add_argument("--vertical", default="dentists")
+    ap.add_argument("--workers", type=int, default=1, help="domains processed concurrently")
+    sched = ap.add_argument_group("scheduling")
+    sched.add_argument("--prioritize", action="store_true",
+                       help="process (or enqueue) domains by expected signals per compute hour, from past runs")
+    sched.add_argument("--domain-budget", type=float, metavar="S",
+                       help="wall-clock seconds per domain before it is cut short (overrides schedule.domain_budget_s)")
+    watch = ap.add_argument_group("watch mode")
+    watch.add_argument("--watch", action="store_true",
+                       help="keep revisiting watched domains (adds --csv rows), appending new/updated cards to --out")
+    watch.add_argument("--watch-once", action="store_true", help="visit the domains that are due once, then exit")
+    dist = ap.add_argument_group("distributed mode")
+    dist.add_argument("--queue", help="SQLite work queue on a volume shared by all nodes")
+    dist.add_argument("--enqueue", action="store_true", help="add --csv rows to the queue")
+    dist.add_argument("--worker", action="store_true", help="claim and process jobs until the queue is drained")
+    dist.add_argument("--merge", action="store_true", help="write finished results from the queue to --out")
+    dist.add_argument("--spawn", type=int, default=0, help="run N local worker processes, then merge")
+    dist.add_argument("--batch", type=int, default=8, help="jobs claimed per lease")
+    dist.add_argument("--lease", type=float, default=900, help="lease length in seconds")
+    dist.add_argument("--node-id", help="worker name prefix (default host); pid and a random suffix keep each process unique")
+    prof = ap.add_argument_group("profiling")
+    prof.add_argument("--profile", metavar="DIR", help="profile graph nodes and tool calls; write pstats + report.txt to DIR")
+    prof.add_argument("--profile-sample", type=float, default=1.0, help="fraction of domains to profile")
+    prof.add_argument("--profile-top", type=int, default=25, help="rows per hotspot/allocation table")
+    prof.add_argument("--profile-no-mem", action="store_true", help="skip tracemalloc (CPU profile only)")
     args = ap.parse_args()
+
+    if args.queue:
+        if args.enqueue:
+            if not args.csv:
+                print("Provide --csv to enqueue"); sys.exit(1)
+            enqueue_csv(args.queue, args.csv, prioritized=args.prioritize, vertical=args.vertical)
+        if args.spawn:
+            spawn_local_nodes(args.queue, args.spawn, args)
+        elif args.worker:
+            run_queue_worker(args.queue, args.vertical, workers=args.workers, batch=args.batch,
+                             lease_s=args.lease, node_id=args.node_id, profiler=_make_profiler(args),
+                             domain_budget=args.domain_budget)
+        if args.merge or args.spawn:
+            merge_queue(args.queue, args.out)
+        return
+
+    if args.watch or args.watch_once:
+        run_watch(args.csv, args.out, args.vertical, workers=args.workers, once=args.watch_once,
+                  profiler=_make_profiler(args), domain_budget=args.domain_budget)
+        return
+
     if not args.csv:
         print("Provide --csv"); sys.exit(1)
-    run_from_csv(args.csv, args.out, args.vertical)
+    run_from_csv(args.csv, args.out, args.vertical, workers=args.workers, profiler=_make_profiler(args),
+                 prioritized=args.prioritize, domain_budget=args.domain_budget)
 
 if __name__ == "__main__":
     main()
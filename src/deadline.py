@@ -0,0 +1,76 @@
+# Per-domain wall-clock budgets, visible to agents, fetches and LLM calls via a contextvar
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+__all__ = ["Budget", "DeadlineExceeded", "budget", "current", "remaining", "expired", "clamp"]
+
+
+class DeadlineExceeded(TimeoutError):
+    """The current domain's budget ran out before (or while) a call could finish."""
+
+
+class Budget:
+    """Deadline for one domain; `tripped` records that some step was cut short."""
+    __slots__ = ("seconds", "until", "tripped")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.until = time.monotonic() + seconds
+        self.tripped = False
+
+    def remaining(self) -> float:
+        return self.until - time.monotonic()
+
+
+_CURRENT: ContextVar[Optional[Budget]] = ContextVar("domain_budget", default=None)
+
+
+@contextmanager
+def budget(seconds: Optional[float]) -> Iterator[Optional[Budget]]:
+    """
+    Run the block under a deadline `seconds` from now (None or <= 0: unlimited).
+
+    Long calls are not interrupted from outside; instead agents check expired()
+    between steps and network calls clamp() their timeouts, so a slow domain
+    stops at the next step or socket timeout and returns what it has.
+    """
+    b = Budget(seconds) if seconds and seconds > 0 else None
+    token = _CURRENT.set(b)
+    try:
+        yield b
+    finally:
+        _CURRENT.reset(token)
+
+
+def current() -> Optional[Budget]:
+    return _CURRENT.get()
+
+
+def remaining() -> Optional[float]:
+    b = _CURRENT.get()
+    return None if b is None else b.remaining()
+
+
+def expired() -> bool:
+    """True once the current budget is spent; marks the budget as tripped."""
+    b = _CURRENT.get()
+    if b is None or b.remaining() > 0:
+        return False
+    b.tripped = True
+    return True
+
+
+def clamp(timeout: float) -> float:
+    """Shrink a network timeout to the time left; raises DeadlineExceeded if none is."""
+    b = _CURRENT.get()
+    if b is None:
+        return timeout
+    left = b.remaining()
+    if left <= 0:
+        b.tripped = True
+        raise DeadlineExceeded(f"domain budget of {b.seconds:.0f}s exhausted")
+    return min(timeout, left)
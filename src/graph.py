@@ -1,24 +1,34 @@
 # graph orchestration
 from src.llm.ollama_runtime import OllamaChat, OllamaConfig
+from src.llm.concurrency import AdaptiveLimiter, LimiterConfig
+from datetime import datetime
 from typing import Optional
 from langgraph.graph import StateGraph, END
 from pydantic import BaseModel
+import requests
 import yaml
+from src import profiling
+from src.patterns import PatternRegistry
+from src.profiling import StageProfiler
 from src.schemas import EvidenceCard,ScrapeResult, ValidateResult
 from src.agents.evidence_card import build_card
-from src.agents.outbound import draft_from_card, EmailDraft
-from src.agents.scraper_agent import run_scraper_agent
-from src.agents.validator_agent import run_validator_agent
+from src.agents.outbound import DraftConfig, DraftInput, Drafter, EmailDraft, company_name, SYSTEM_PROMPT as OUTBOUND_SYSTEM
+from src.agents.scraper_agent import run_scraper_agent, SYSTEM as SCRAPER_SYSTEM
+from src.agents.validator_agent import run_validator_agent, system_prompt as validator_system
+from src.tools import blobstore, hostcache, httpcache
+from src.tools.web import configure_fetch
 
 CONFIDENCE_THRESHOLD = 0.6
 
 class NodeState(BaseModel):
     domain: str
     company: Optional[str] = None
+    vertical: Optional[str] = None       # picks the signal phrases; None uses the graph's default vertical
     scrape_result: Optional[ScrapeResult] = None
     validate_result: Optional[ValidateResult] = None
     card: Optional[EvidenceCard] = None
     email: Optional[EmailDraft] = None
+    draft_pending: bool = False          # card qualifies but its email is left to a batched Drafter.draft_many
 
 def scrape_node(state: NodeState, llm: OllamaChat) -> NodeState:
     candidate = ["/","/locations","/book","/schedule","/appointments","/careers","/jobs","/blog","/news","/press"]
@@ -27,74 +37,166 @@ def scrape_node(state: NodeState, llm: OllamaChat) -> NodeState:
     print(f"DEBUG GRAPH: Scrape result: {state.scrape_result}")
     return state
 
-def validate_node(state: NodeState, llm: OllamaChat, patterns_cfg: dict) -> NodeState:
+def validate_node(state: NodeState, llm: OllamaChat, patterns: PatternRegistry, default_vertical: Optional[str] = None) -> NodeState:
     print(f"DEBUG GRAPH: Starting validation")
     print(f"DEBUG GRAPH: Scrape result ok: {state.scrape_result.ok if state.scrape_result else 'None'}")
-    print(f"DEBUG GRAPH: Pages count: {len(state.scrape_result.pages) if state.scrape_result and state.scrape_result.pages else 0}")
+    print(f"DEBUG GRAPH: Pages count: {len(state.scrape_result.docs) if state.scrape_result and state.scrape_result.docs else 0}")
     
-    if not state.scrape_result or not state.scrape_result.ok or not state.scrape_result.pages:
+    if not state.scrape_result or not state.scrape_result.ok or not state.scrape_result.docs:
         print("DEBUG GRAPH: No valid scrape data, skipping validation")
         return state
         
-    PATS = {
-        "expansion": patterns_cfg.get("expansion", ["grand opening","now open","new location"]),
-        "scheduler": patterns_cfg.get("scheduler", ["calendly","acuity","book","schedule","appointment"]),
-        "hiring":    patterns_cfg.get("hiring",    ["hiring","role","apply","careers","jobs"]),
-    }
-    print(f"DEBUG GRAPH: Patterns: {PATS}")
+    vp = patterns.get(state.vertical or default_vertical)
+    print(f"DEBUG GRAPH: Patterns ({vp.name}): {vp.phrases}")
     
     urls_str = {k: str(v) for k, v in state.scrape_result.urls.items()} if state.scrape_result and state.scrape_result.urls else {}
-    vr = run_validator_agent(state.domain, state.scrape_result.pages, urls_str, PATS, llm=llm, step_limit=4)
+    vr = run_validator_agent(state.domain, state.scrape_result.docs, urls_str, vp, llm=llm, step_limit=4)
     print(f"DEBUG GRAPH: Validation result: {vr}")
     state.validate_result = vr
     
     if vr.ok and vr.evidence_url and vr.snippet:
         print(f"DEBUG GRAPH: Building card for signal: {vr.signal_type}")
-        state.card = build_card(vr.signal_type, str(vr.evidence_url), vr.snippet, vr.published_at)
+        # the model rarely reads a date off the page; fall back to the one extracted from the evidence page's HTML
+        published = vr.published_at or page_published(state.scrape_result.docs, str(vr.evidence_url))
+        state.card = build_card(vr.signal_type, str(vr.evidence_url), vr.snippet, published)
         print(f"DEBUG GRAPH: Card built: {state.card}")
     else:
         print(f"DEBUG GRAPH: No valid signal found")
     return state
 
-def outbound_node(state: NodeState, llm: OllamaChat) -> NodeState:
+def page_published(docs: dict, url: str) -> Optional[datetime]:
+    """published_at extracted at scrape time for the page at `url` (docs are keyed by path or URL)."""
+    norm = url.rstrip("/")
+    for key, doc in docs.items():
+        if norm in (key.rstrip("/"), (doc.url or "").rstrip("/")):
+            return doc.published_at
+    return None
+
+def draft_input(domain: str, company: Optional[str], card: EvidenceCard) -> DraftInput:
+    return DraftInput(
+        company=company_name(domain, company),
+        domain=domain,
+        signal_type=card.signal_type,
+        url=str(card.canonical_url),
+        snippet=card.snippet,
+        confidence=card.confidence,
+    )
+
+def outbound_node(state: NodeState, drafter: Drafter, defer: bool = False) -> NodeState:
     print(f"DEBUG GRAPH: Starting outbound")
     print(f"DEBUG GRAPH: Card exists: {state.card is not None}")
     print(f"DEBUG GRAPH: Card confidence: {state.card.confidence if state.card else 'N/A'}")
     
     if state.card and (state.card.confidence >= CONFIDENCE_THRESHOLD):
         print(f"DEBUG GRAPH: Confidence threshold met, drafting email")
-        state.email = draft_from_card(
-            llm,
-            company=state.company or state.domain.split(".")[0].title(),
-            domain=state.domain,
-            signal_type=state.card.signal_type,
-            url=str(state.card.canonical_url),
-            snippet=state.card.snippet,
-            confidence=state.card.confidence
-        )
-        print(f"DEBUG GRAPH: Email drafted: {state.email}")
+        inp = draft_input(state.domain, state.company, state.card)
+        if defer and drafter.batching:
+            # templates are instant; LLM drafts wait for the runner to batch them across domains
+            state.email = drafter.template(inp)
+            state.draft_pending = state.email is None
+        else:
+            state.email = drafter.draft(inp)
+        print(f"DEBUG GRAPH: Email drafted: {state.email} (pending batch: {state.draft_pending})")
     else:
         print(f"DEBUG GRAPH: Confidence threshold not met or no card")
     return state
 
-def _build_chat(cfg_block: dict) -> OllamaChat:
+def _build_chat(cfg_block: dict, role: str) -> OllamaChat:
+    conc = dict(cfg_block.get("concurrency") or {})
+    limiter = AdaptiveLimiter(role, LimiterConfig(**conc)) if conc.pop("enable", True) else None
     return OllamaChat(OllamaConfig(
         model_id      = cfg_block.get("model_id", "phi3.5"),
         max_new_tokens= cfg_block.get("max_new_tokens", 240),
         temperature   = cfg_block.get("temperature", 0.1),
-    ))
+        structured_output = cfg_block.get("structured_output", True),
+        keep_alive    = str(cfg_block.get("keep_alive", "30m")),
+        endpoint_url  = cfg_block.get("endpoint_url"),
+        request_timeout = float(cfg_block.get("request_timeout", 600)),
+    ), limiter=limiter)
+
+def _draft_config(cfg_block: dict) -> DraftConfig:
+    d = cfg_block.get("drafting") or {}
+    return DraftConfig(
+        mode = str(d.get("mode", "auto")),
+        template_min_confidence = float(d.get("template_min_confidence", 0.8)),
+        batch_size = int(d.get("batch_size", 8)),
+        max_tokens_per_draft = int(d.get("max_tokens_per_draft", 200)),
+        templates = d.get("templates"),
+    )
+
+def make_drafter(config_path="configs/config.yml") -> Drafter | None:
+    """
+    Outbound drafter (model + drafting policy) for runners that batch drafts
+    across domains; None when llm.outbound.drafting does not batch.
+    """
+    cfg = yaml.safe_load(open(config_path))
+    block = (cfg.get("llm") or {}).get("outbound", {})
+    dcfg = _draft_config(block)
+    if dcfg.mode != "auto" or dcfg.batch_size <= 1:
+        return None
+    llm = _build_chat(block, "outbound")
+    _warm(llm, block, OUTBOUND_SYSTEM)
+    return Drafter(llm, dcfg)
 
-def make_graph(config_path="configs/config.yml", vertical_config: dict | None = None):
+def _warm(llm: OllamaChat, cfg_block: dict, system_prompt: str) -> None:
+    """Load the model and prefill its static system prompt before the first domain."""
+    if not cfg_block.get("warm_up", True):
+        return
+    try:
+        llm.warm([{"role": "system", "content": system_prompt}])
+    except requests.RequestException as e:
+        print(f"DEBUG GRAPH: warm-up failed for {llm.cfg.model_id}: {e}")
+
+def _profiled(name: str, fn):
+    """Run a node under the installed StageProfiler, sampled per domain."""
+    def run(s):
+        with profiling.stage(name, key=getattr(s, "domain", "")):
+            return fn(s)
+    return run
+
+def make_patterns(config_path="configs/config.yml") -> PatternRegistry:
     cfg = yaml.safe_load(open(config_path))
+    v = cfg.get("verticals") or {}
+    return PatternRegistry(v.get("dir", "configs/verticals"), check_s=float(v.get("reload_check_s", 5)))
+
+def make_graph(config_path="configs/config.yml", vertical: str | None = None,
+               profiler: StageProfiler | None = None, drafter: Drafter | None = None,
+               patterns: PatternRegistry | None = None):
+    """
+    Compile the scrape -> validate -> outbound graph. With a `drafter` from
+    make_drafter, cards that need an LLM draft are left with draft_pending=True
+    for the caller to batch; otherwise every draft is written inside the graph.
+    Each domain is validated with the phrases of its state's vertical, falling
+    back to `vertical`, so one graph serves a mixed CSV.
+    """
+    cfg = yaml.safe_load(open(config_path))
+    crawl = cfg.get("crawl", {})
+    configure_fetch(max_bytes=crawl.get("max_bytes"), content_types=crawl.get("content_types"))
+    blobstore.configure((cfg.get("storage") or {}).get("blob_dir"))
+    hostcache.configure(
+        crawl.get("host_cache"),
+        origin_ttl=float(crawl.get("host_cache_ttl_s", 7 * 86400)),
+        dns_ttl=float(crawl.get("dns_ttl_s", 300)),
+    )
+    httpcache.configure(crawl.get("http_cache"), ttl=float(crawl.get("http_cache_ttl_s", 30 * 86400)))
+    patterns = patterns or make_patterns(config_path)
     llm_root = cfg.get("llm", {})
-    llm_val = _build_chat(llm_root.get("validator", {}))
-    llm_out = _build_chat(llm_root.get("outbound", {}))
-    patterns = (vertical_config or {}).get("phrases", {})
+    llm_val = _build_chat(llm_root.get("validator", {}), "validator")
+    # scrape and validate share this model; prefill both system prefixes (the default vertical's hints)
+    _warm(llm_val, llm_root.get("validator", {}), SCRAPER_SYSTEM)
+    _warm(llm_val, llm_root.get("validator", {}), validator_system(patterns.get(vertical).hints))
+    defer = drafter is not None
+    if drafter is None:
+        llm_out = _build_chat(llm_root.get("outbound", {}), "outbound")
+        _warm(llm_out, llm_root.get("outbound", {}), OUTBOUND_SYSTEM)
+        drafter = Drafter(llm_out, _draft_config(llm_root.get("outbound", {})))
+
+    profiling.install(profiler)
 
     g = StateGraph(NodeState)
-    g.add_node("scrape_node",   lambda s: scrape_node(s, llm=llm_val)) # type: ignore
-    g.add_node("validate_node", lambda s: validate_node(s, llm=llm_val, patterns_cfg=patterns)) # type: ignore
-    g.add_node("outbound_gate", lambda s: outbound_node(s, llm=llm_out)) # pyright: ignore[reportArgumentType]
+    g.add_node("scrape_node",   _profiled("scrape_node", lambda s: scrape_node(s, llm=llm_val))) # type: ignore
+    g.add_node("validate_node", _profiled("validate_node", lambda s: validate_node(s, llm=llm_val, patterns=patterns, default_vertical=vertical))) # type: ignore
+    g.add_node("outbound_gate", _profiled("outbound_node", lambda s: outbound_node(s, drafter=drafter, defer=defer))) # pyright: ignore[reportArgumentType]
     g.set_entry_point("scrape_node")
     g.add_edge("scrape_node","validate_node")
     g.add_edge("validate_node","outbound_gate")
@@ -0,0 +1,73 @@
+# JSON state files shared by threads and worker processes: locked read-merge-write through unique tmp files
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no inter-process lock
+    fcntl = None
+
+__all__ = ["locked", "merge_newest", "read", "write", "update"]
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Exclusive lock on the sidecar <path>.lock, held across processes (and threads, each opening its own fd)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def read(path: Path, *, label: str = "JSONFILE") -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"DEBUG {label}: ignoring unreadable {path}: {e}")
+        return {}
+
+
+def write(path: Path, data: Dict[str, Any]) -> None:
+    """Replace path atomically; the tmp file is unique so concurrent writers never share one."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(data))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def merge_newest(disk: Dict[str, Dict[str, Any]], mine: Dict[str, Dict[str, Any]], *,
+                 ts: str = "ts") -> Dict[str, Dict[str, Any]]:
+    """Union of two {key: entry} maps, keeping the entry with the larger `ts` field for keys in both."""
+    out = dict(disk)
+    for k, e in mine.items():
+        old = out.get(k)
+        if old is None or (old.get(ts) or 0) <= (e.get(ts) or 0):
+            out[k] = e
+    return out
+
+
+def update(path: Path, merge: Callable[[Dict[str, Any]], Dict[str, Any]], *, label: str = "JSONFILE") -> Dict[str, Any]:
+    """Under the lock: read what is on disk, let `merge` combine it with ours, write the result back and return it."""
+    with locked(path):
+        data = merge(read(path, label=label))
+        write(path, data)
+    return data
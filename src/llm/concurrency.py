@@ -0,0 +1,121 @@
+# Adaptive concurrency limiting for LLM calls
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from src import metrics
+
+
+@dataclass
+class LimiterConfig:
+    initial: int = 2
+    min_limit: int = 1
+    max_limit: int = 16
+    backoff: float = 0.7        # multiplicative decrease on errors / latency blow-up
+    tolerance: float = 1.5      # allowed slowdown vs. the best observed seconds-per-token
+    baseline_drift: float = 0.001  # lets the baseline creep up when prompts get longer
+
+
+class Slot:
+    """
+    Handle for one admitted request; set `tokens` so latency can be normalised.
+    A `cancelled` slot (caller gave up, e.g. its deadline ran out) frees its
+    place without counting as a latency sample or an error.
+    """
+    __slots__ = ("started", "tokens", "error", "cancelled")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.tokens = 0
+        self.error = False
+        self.cancelled = False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limiter around LLM requests.
+
+    The in-flight limit grows by ~1 per `limit` successful completions while the
+    limiter is saturated and latency per token stays within `tolerance` of the
+    best observed; it is multiplied by `backoff` on an error/timeout or a latency
+    blow-up. Requests that started before the last decrease do not trigger
+    another one, so a burst of slow replies backs off once, not N times.
+
+        with limiter.slot() as s:
+            reply = post(...)
+            s.tokens = reply_tokens
+    """
+
+    def __init__(self, name: str, cfg: Optional[LimiterConfig] = None):
+        self.name = name
+        self.cfg = cfg or LimiterConfig()
+        self.limit = float(max(self.cfg.min_limit, min(self.cfg.initial, self.cfg.max_limit)))
+        self._inflight = 0
+        self._baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        metrics.gauge(f"llm.{self.name}.limit", self.limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def acquire(self) -> Slot:
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                self._cond.wait()
+            self._inflight += 1
+            return Slot(time.perf_counter())
+
+    def release(self, slot: Slot) -> None:
+        now = time.perf_counter()
+        latency = now - slot.started
+        cost = latency / slot.tokens if slot.tokens else latency
+        with self._cond:
+            saturated = self._inflight >= int(self.limit)
+            self._inflight -= 1
+            if slot.cancelled:
+                pass
+            elif slot.error:
+                self._decrease(slot, now)
+            else:
+                if self._baseline is None:
+                    self._baseline = cost
+                else:
+                    self._baseline = min(cost, self._baseline * (1 + self.cfg.baseline_drift))
+                if cost > self._baseline * self.cfg.tolerance:
+                    self._decrease(slot, now)
+                elif saturated:
+                    self.limit = min(float(self.cfg.max_limit), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+            limit = self.limit
+        metrics.gauge(f"llm.{self.name}.limit", limit)
+        if slot.cancelled:
+            metrics.incr(f"llm.{self.name}.cancelled")
+            return
+        metrics.observe(f"llm.{self.name}.latency", latency)
+        if slot.error:
+            metrics.incr(f"llm.{self.name}.errors")
+        else:
+            metrics.incr(f"llm.{self.name}.tokens", slot.tokens)
+
+    def _decrease(self, slot: Slot, now: float) -> None:
+        if slot.started < self._last_decrease:
+            return
+        self.limit = max(float(self.cfg.min_limit), self.limit * self.cfg.backoff)
+        self._last_decrease = now
+
+    @contextmanager
+    def slot(self) -> Iterator[Slot]:
+        s = self.acquire()
+        try:
+            yield s
+        except Exception:
+            s.error = not s.cancelled
+            raise
+        finally:
+            self.release(s)
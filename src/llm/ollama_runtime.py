@@ -1,8 +1,16 @@
 import os
 import json
+import threading
+import time
 import requests
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
+
+from src import deadline, metrics
+from src.llm.concurrency import AdaptiveLimiter
+
+# load_duration above this counts as a cold start (model was not resident)
+COLD_START_S = 0.5
 
 @dataclass
 class OllamaConfig:
@@ -12,6 +20,9 @@ class OllamaConfig:
     endpoint_url: Optional[str] = None # uses OLLAMA_BASE_URL
     device: str = "auto"               
     dtype: str = "float16"            
+    structured_output: bool = True     # send a JSON schema via Ollama's `format`
+    keep_alive: str = "30m"            # how long Ollama keeps the model loaded after a call
+    request_timeout: float = 600.0
 
 class OllamaChat:
     """
@@ -21,27 +32,67 @@ class OllamaChat:
       OLLAMA_BASE_URL (optional) defaults to "http://localhost:11434"
 
     API:
-      chat(messages) -> str
+      chat(messages, format=None, max_new_tokens=None) -> str
       messages: list of {"role": "system"|"user"|"assistant", "content": "..."}
+      format: JSON schema dict (or "json") constraining the reply; ignored when
+              cfg.structured_output is False
+      max_new_tokens: per-call override of cfg.max_new_tokens (e.g. batched drafts)
+      warm(prefix=None) -> float
+      loads the model (and optionally prefills a static message prefix) ahead of use
+
+    Keep the leading messages (system prompt, few-shot examples) byte-identical
+    across calls: Ollama reuses the KV cache for a matching prompt prefix.
+    Per-call load/prefill/decode times are recorded in src.metrics and kept
+    on `last_stats`.
+
+    An optional AdaptiveLimiter bounds in-flight requests (shared by every
+    thread using this client); cfg.endpoint_url overrides OLLAMA_BASE_URL.
+    Inside a src.deadline budget the request timeout is clamped to the time
+    left and a call cut short by it raises DeadlineExceeded. Each thread
+    keeps one pooled session, so calls reuse a keep-alive connection.
     """
-    def __init__(self, cfg: OllamaConfig):
+    def __init__(self, cfg: OllamaConfig, limiter: Optional[AdaptiveLimiter] = None):
         self.cfg = cfg
-        self.ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+        base = cfg.endpoint_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.ollama_url = base.rstrip("/")
+        self.limiter = limiter
+        self.last_stats: Dict[str, float] = {}
+        self._local = threading.local()
 
-    def chat(self, messages: List[Dict[str, Any]]) -> str:
+    def _session(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+        return s
+
+    def chat(self, messages: List[Dict[str, Any]], *, format: Union[Dict[str, Any], str, None] = None,
+             max_new_tokens: Optional[int] = None) -> str:
         url = f"{self.ollama_url}/api/chat"
-        payload = {
+        payload: Dict[str, Any] = {
             "model": self.cfg.model_id,
             "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
             "options": {
                 "temperature": self.cfg.temperature,
-                "num_predict": self.cfg.max_new_tokens,
+                "num_predict": max_new_tokens or self.cfg.max_new_tokens,
             },
             "stream": False,
+            "keep_alive": self.cfg.keep_alive,
         }
-        r = requests.post(url, json=payload, timeout=600)
-        r.raise_for_status()
-        data = r.json()
+        if format is not None and self.cfg.structured_output:
+            payload["format"] = format
+        t0 = time.perf_counter()
+        if self.limiter is None:
+            data = self._post(url, payload)
+        else:
+            with self.limiter.slot() as slot:
+                try:
+                    data = self._post(url, payload)
+                except deadline.DeadlineExceeded:
+                    slot.cancelled = True  # our budget, not server overload
+                    raise
+                if isinstance(data, dict):
+                    slot.tokens = data.get("prompt_eval_count", 0) + data.get("eval_count", 0)
+        self._record_stats(data, time.perf_counter() - t0)
 
         if isinstance(data, dict):
             if "message" in data and isinstance(data["message"], dict):
@@ -51,3 +102,63 @@ class OllamaChat:
             if "response" in data:
                 return data.get("response", "")
         return json.dumps(data)
+
+    def _post(self, url: str, payload: Dict[str, Any]) -> Any:
+        timeout = deadline.clamp(self.cfg.request_timeout)
+        try:
+            r = self._session().post(url, json=payload, timeout=timeout)
+        except requests.Timeout:
+            if timeout < self.cfg.request_timeout and deadline.expired():
+                raise deadline.DeadlineExceeded(f"{self.cfg.model_id} call cut off by domain budget")
+            raise
+        r.raise_for_status()
+        return r.json()
+
+    def warm(self, prefix: Optional[List[Dict[str, Any]]] = None) -> float:
+        """
+        Load the model and pin it with keep_alive. With a prefix (e.g. the static
+        system prompt) one token is generated so the prefix lands in the KV cache.
+        Returns wall-clock seconds spent.
+        """
+        payload: Dict[str, Any] = {
+            "model": self.cfg.model_id,
+            "messages": [{"role": m["role"], "content": m["content"]} for m in (prefix or [])],
+            "stream": False,
+            "keep_alive": self.cfg.keep_alive,
+        }
+        if prefix:
+            payload["options"] = {"temperature": self.cfg.temperature, "num_predict": 1}
+        t0 = time.perf_counter()
+        self._post(f"{self.ollama_url}/api/chat", payload)
+        elapsed = time.perf_counter() - t0
+        metrics.observe(f"llm.{self.cfg.model_id}.warmup", elapsed)
+        print(f"DEBUG LLM: warmed {self.cfg.model_id} in {elapsed:.2f}s")
+        return elapsed
+
+    def _record_stats(self, data: Any, wall_s: float) -> None:
+        # Ollama reports durations in nanoseconds
+        if not isinstance(data, dict):
+            return
+        ns = 1e9
+        stats = {
+            "wall_s": wall_s,
+            "load_s": data.get("load_duration", 0) / ns,
+            "prefill_s": data.get("prompt_eval_duration", 0) / ns,
+            "decode_s": data.get("eval_duration", 0) / ns,
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "output_tokens": data.get("eval_count", 0),
+        }
+        self.last_stats = stats
+        model = self.cfg.model_id
+        metrics.observe(f"llm.{model}.load", stats["load_s"])
+        metrics.observe(f"llm.{model}.prefill", stats["prefill_s"])
+        metrics.observe(f"llm.{model}.decode", stats["decode_s"])
+        metrics.incr(f"llm.{model}.prompt_tokens", stats["prompt_tokens"])
+        metrics.incr(f"llm.{model}.output_tokens", stats["output_tokens"])
+        if stats["load_s"] >= COLD_START_S:
+            metrics.incr(f"llm.{model}.cold_starts")
+        print(
+            f"DEBUG LLM: {model} wall={wall_s:.2f}s load={stats['load_s']:.2f}s "
+            f"prefill={stats['prefill_s']:.2f}s ({stats['prompt_tokens']} tok) "
+            f"decode={stats['decode_s']:.2f}s ({stats['output_tokens']} tok)"
+        )
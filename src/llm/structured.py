@@ -0,0 +1,135 @@
+# Structured output helpers: JSON schemas for Ollama's `format` parameter and
+# one tolerant extractor for models that ignore it.
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterator, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+M = TypeVar("M", bound=BaseModel)
+
+_OPEN = {"{": "}", "[": "]"}
+
+
+def schema_for(model: Type[BaseModel], *, exclude: tuple = ()) -> Dict[str, Any]:
+    """JSON schema for a pydantic model, suitable for Ollama's `format`.
+
+    Fields in `exclude` (internal, never produced by the model) are dropped,
+    along with any $defs only they referenced.
+    """
+    schema = model.model_json_schema()
+    if not exclude:
+        return schema
+    props = schema.get("properties", {})
+    for name in exclude:
+        props.pop(name, None)
+    schema["required"] = [r for r in schema.get("required", []) if r not in exclude]
+    if "$defs" in schema:
+        rest = json.dumps({k: v for k, v in schema.items() if k != "$defs"})
+        schema["$defs"] = {k: v for k, v in schema["$defs"].items() if f"#/$defs/{k}" in rest}
+        if not schema["$defs"]:
+            del schema["$defs"]
+    return schema
+
+
+def iter_json_spans(text: str) -> Iterator[str]:
+    """
+    Yield every top-level {...} / [...] span in text, in a single left-to-right scan.
+
+    Markdown fences and prose around the JSON are skipped, and raw newlines/tabs
+    inside string literals are escaped so json.loads accepts them. If an opening
+    brace is never closed the scan resumes right after it, so stray braces in
+    prose do not hide a later object.
+    """
+    pos, n = 0, len(text)
+    while pos < n:
+        start = -1
+        stack: list = []
+        buf: list = []
+        in_str = escape = False
+        i = pos
+        while i < n:
+            ch = text[i]
+            if start < 0:
+                if ch in _OPEN:
+                    start = i
+                    stack.append(_OPEN[ch])
+                    buf = [ch]
+                i += 1
+                continue
+            if in_str:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_str = False
+                elif ch == "\n":
+                    ch = "\\n"
+                elif ch == "\r":
+                    ch = "\\r"
+                elif ch == "\t":
+                    ch = "\\t"
+                buf.append(ch)
+                i += 1
+                continue
+            buf.append(ch)
+            if ch == '"':
+                in_str = True
+            elif ch in _OPEN:
+                stack.append(_OPEN[ch])
+            elif ch in "}]":
+                if ch != stack[-1]:
+                    break  # mismatched bracket; restart after `start`
+                stack.pop()
+                if not stack:
+                    yield "".join(buf)
+                    start = -1
+            i += 1
+        if start < 0:
+            return
+        pos = start + 1
+
+
+def extract_json(text: str, *, require: Optional[str] = None) -> Any:
+    """
+    First JSON value in text that parses (and, for objects, contains `require`).
+
+    Objects wrapping the wanted one (e.g. {"result": {...}}) are unwrapped one level.
+    Returns None when nothing usable is found.
+    """
+    for span in iter_json_spans(text):
+        try:
+            data = json.loads(span)
+        except json.JSONDecodeError:
+            continue
+        if require is None:
+            return data
+        if isinstance(data, dict):
+            if require in data:
+                return data
+            for v in data.values():
+                if isinstance(v, dict) and require in v:
+                    return v
+    return None
+
+
+def parse_model(text: str, model: Type[M], *, require: Optional[str] = None) -> Optional[M]:
+    """Validate the first matching JSON object in text against model, or None."""
+    for span in iter_json_spans(text):
+        try:
+            data = json.loads(span)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        candidates = [data] + [v for v in data.values() if isinstance(v, dict)]
+        for c in candidates:
+            if require and require not in c:
+                continue
+            try:
+                return model.model_validate(c)
+            except ValidationError as e:
+                print(f"DEBUG STRUCTURED: {model.__name__} validation error: {e.error_count()} errors")
+    return None
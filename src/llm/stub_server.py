@@ -0,0 +1,170 @@
+"""Latency-simulating stand-in for an Ollama server, for exercising the adaptive limiter.
+
+Service time grows with prompt/output size and degrades once more than
+`capacity` requests are in flight; beyond `max_inflight` it answers 503.
+
+Serve only (point OLLAMA_BASE_URL or llm.<role>.endpoint_url at it):
+    python -m src.llm.stub_server --port 11555 --capacity 4
+
+Serve and drive it with concurrent clients through an AdaptiveLimiter:
+    python -m src.llm.stub_server --drive --clients 16 --requests 200
+
+Requests whose `format` asks for an email draft (or an array of indexed
+drafts) get canned drafts back, sized like real ones, so the outbound
+drafter can be benchmarked against it (benchmarks/bench_drafting.py).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+_DRAFT = {"subject": "Congrats on the new location",
+          "body": " ".join(["Saw the announcement and wanted to reach out."] * 8),
+          "call_to_action": "Open to a 10-minute walkthrough next week?"}
+
+
+def _canned_reply(body: dict) -> str | None:
+    """Draft-shaped content for draft/batch formats, None for anything else."""
+    fmt = body.get("format")
+    if not isinstance(fmt, dict):
+        return None
+    if fmt.get("type") == "array" and "subject" in (fmt.get("items") or {}).get("properties", {}):
+        n = max(1, body["messages"][-1].get("content", "").count("INPUT:"))
+        return json.dumps([{"index": i, **_DRAFT} for i in range(n)])
+    if "subject" in fmt.get("properties", {}):
+        return json.dumps(_DRAFT)
+    return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StubOllamaServer"
+
+    def log_message(self, *args):  # keep the console quiet
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        srv = self.server
+        with srv.lock:
+            srv.inflight += 1
+            inflight = srv.inflight
+        try:
+            if inflight > srv.max_inflight:
+                self._reply(503, {"error": "server overloaded"})
+                return
+            prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+            prompt_tokens = max(1, prompt_chars // 4)
+            out_tokens = int((body.get("options") or {}).get("num_predict", 32))
+            content = _canned_reply(body)
+            if content is not None:  # a real model stops at the end of the JSON, not at num_predict
+                out_tokens = min(out_tokens, len(content) // 4)
+            prefill = prompt_tokens * srv.prefill_s_per_token
+            decode = out_tokens * srv.decode_s_per_token
+            # past `capacity` concurrent requests the host time-slices, so everyone slows down
+            slowdown = max(1.0, inflight / srv.capacity)
+            time.sleep((prefill + decode) * slowdown)
+            ns = 1e9
+            self._reply(200, {
+                "model": body.get("model"),
+                "message": {"role": "assistant", "content": content or "{}"},
+                "done": True,
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prefill * slowdown * ns),
+                "eval_count": out_tokens,
+                "eval_duration": int(decode * slowdown * ns),
+            })
+        finally:
+            with srv.lock:
+                srv.inflight -= 1
+
+    def _reply(self, code: int, data: dict) -> None:
+        raw = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=11555, *, capacity=4, max_inflight=12,
+                 prefill_s_per_token=0.0002, decode_s_per_token=0.004):
+        super().__init__((host, port), _Handler)
+        self.capacity = capacity
+        self.max_inflight = max_inflight
+        self.prefill_s_per_token = prefill_s_per_token
+        self.decode_s_per_token = decode_s_per_token
+        self.inflight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def drive(server: StubOllamaServer, *, clients: int, requests: int, max_limit: int) -> None:
+    """Fire `requests` chats from `clients` threads through one limited OllamaChat."""
+    from src import metrics
+    from src.llm.concurrency import AdaptiveLimiter, LimiterConfig
+    from src.llm.ollama_runtime import OllamaChat, OllamaConfig
+
+    limiter = AdaptiveLimiter("stub", LimiterConfig(initial=1, max_limit=max_limit))
+    chat = OllamaChat(OllamaConfig(model_id="stub", max_new_tokens=32, endpoint_url=server.url,
+                                   request_timeout=30), limiter=limiter)
+    msgs = [{"role": "user", "content": "x" * 800}]
+    trajectory = []
+
+    def one(_):
+        try:
+            chat.chat(msgs)
+        except Exception:
+            pass
+        trajectory.append(limiter.limit)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - t0
+    snap = metrics.snapshot()
+    tokens = snap["counters"].get("llm.stub.tokens", 0)
+    errors = snap["counters"].get("llm.stub.errors", 0)
+    print(f"requests={requests} clients={clients} elapsed={elapsed:.1f}s "
+          f"tokens/s={tokens / elapsed:.0f} errors={int(errors)} final_limit={limiter.limit:.2f}")
+    step = max(1, len(trajectory) // 20)
+    print("limit trajectory:", " ".join(f"{v:.1f}" for v in trajectory[::step]))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=11555)
+    ap.add_argument("--capacity", type=int, default=4, help="concurrent requests served without slowdown")
+    ap.add_argument("--max-inflight", type=int, default=12, help="above this the stub answers 503")
+    ap.add_argument("--drive", action="store_true", help="run a load test against the stub and exit")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--max-limit", type=int, default=16)
+    args = ap.parse_args()
+
+    server = StubOllamaServer(port=args.port, capacity=args.capacity, max_inflight=args.max_inflight)
+    if not args.drive:
+        print(f"stub Ollama listening on {server.url}")
+        server.serve_forever()
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        drive(server, clients=args.clients, requests=args.requests, max_limit=args.max_limit)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
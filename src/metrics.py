@@ -0,0 +1,85 @@
+# run-level counters and timings shared by agents, tools and the CLI
+from __future__ import annotations
+
+import sys
+import threading
+from collections import defaultdict
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_timings: Dict[str, list] = {}   # name -> [count, total_s, max_s]
+_gauges: Dict[str, float] = {}
+
+
+def incr(name: str, n: float = 1) -> None:
+    """Add n to a named counter."""
+    with _lock:
+        _counters[name] += n
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one duration sample under name."""
+    with _lock:
+        t = _timings.setdefault(name, [0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += seconds
+        t[2] = max(t[2], seconds)
+
+
+def gauge(name: str, value: float) -> None:
+    """Set a point-in-time value (last write wins)."""
+    with _lock:
+        _gauges[name] = value
+
+
+def gauge_max(name: str, value: float) -> None:
+    """Keep the largest value seen for name."""
+    with _lock:
+        _gauges[name] = max(value, _gauges.get(name, value))
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB (0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def snapshot() -> dict:
+    """Copy of all counters and timing aggregates."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {
+                k: {"count": c, "total_s": round(tot, 4), "mean_s": round(tot / c, 4) if c else 0.0, "max_s": round(mx, 4)}
+                for k, (c, tot, mx) in _timings.items()
+            },
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+        _gauges.clear()
+
+
+def report() -> str:
+    """Human readable summary, one metric per line."""
+    snap = snapshot()
+    lines = []
+    for k in sorted(snap["counters"]):
+        v = snap["counters"][k]
+        lines.append(f"{k}: {int(v) if float(v).is_integer() else round(v, 4)}")
+    for k in sorted(snap["gauges"]):
+        lines.append(f"{k}: {round(snap['gauges'][k], 4)}")
+    for k in sorted(snap["timings"]):
+        t = snap["timings"][k]
+        lines.append(f"{k}: n={t['count']} mean={t['mean_s']}s max={t['max_s']}s total={t['total_s']}s")
+    return "\n".join(lines)
@@ -0,0 +1,270 @@
+# Result records: fast JSON encoding, buffered (optionally compressed) JSONL and Parquet output, and a matching reader
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
+
+from src import metrics
+
+try:  # optional: ~2-3x faster than the json module for our records
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if TYPE_CHECKING:
+    from src.graph import NodeState
+
+__all__ = ["OutputWriter", "detect_format", "dumps", "loads", "read_records", "to_record", "FORMATS"]
+
+FORMATS = ("jsonl", "jsonl.gz", "jsonl.zst", "parquet")
+
+# flat column layout for Parquet; nested card/email fields become "card.<field>" / "email.<field>"
+_COLUMNS = [
+    ("domain", "string"), ("company", "string"), ("vertical", "string"),
+    ("partial", "bool"), ("elapsed_s", "float64"), ("error", "string"),
+    ("card.signal_type", "string"), ("card.canonical_url", "string"),
+    ("card.first_seen", "timestamp"), ("card.last_seen", "timestamp"),
+    ("card.snippet", "string"), ("card.confidence", "float64"), ("card.explain", "string"),
+    ("card.source_site", "string"), ("card.location_guess", "string"), ("card.screenshot_path", "string"),
+    ("email.subject", "string"), ("email.body", "string"), ("email.call_to_action", "string"),
+]
+
+
+def to_record(row: Dict[str, str], final: "NodeState") -> Dict[str, Any]:
+    """Output record for one domain; card/email are dumped straight to JSON-safe values by pydantic."""
+    return {
+        "domain": row["domain"],
+        "company": row.get("company"),
+        "vertical": row.get("vertical") or final.vertical,
+        "card": final.card.model_dump(mode="json") if final.card else None,
+        "email": final.email.model_dump(mode="json") if final.email else None,
+    }
+
+
+def dumps(record: Dict[str, Any]) -> bytes:
+    """One JSONL line (with trailing newline) as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def loads(line: bytes | str) -> Any:
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def detect_format(path: str) -> str:
+    name = str(path).lower()
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith(".gz"):
+        return "jsonl.gz"
+    if name.endswith(".zst"):
+        return "jsonl.zst"
+    return "jsonl"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd output needs the `zstandard` package (pip install zstandard)") from e
+    return zstandard
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet output needs the `pyarrow` package (pip install pyarrow)") from e
+    return pa, pq
+
+
+def _arrow_schema(pa):
+    types = {"string": pa.string(), "bool": pa.bool_(), "float64": pa.float64(),
+             "timestamp": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in _COLUMNS])
+
+
+def _flatten(record: Dict[str, Any]) -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for name, kind in _COLUMNS:
+        head, _, field = name.partition(".")
+        v = (record.get(head) or {}).get(field) if field else record.get(head)
+        if kind == "timestamp" and isinstance(v, str):
+            v = datetime.fromisoformat(v)
+        flat[name] = v
+    return flat
+
+
+def _unflatten(flat: Dict[str, Any]) -> Dict[str, Any]:
+    rec: Dict[str, Any] = {}
+    nested: Dict[str, Dict[str, Any]] = {"card": {}, "email": {}}
+    for name, v in flat.items():
+        if isinstance(v, datetime):
+            v = v.isoformat().replace("+00:00", "Z")  # same form pydantic writes to JSONL
+        head, _, field = name.partition(".")
+        if field:
+            nested[head][field] = v
+        else:
+            rec[name] = v
+    for head, fields in nested.items():
+        rec[head] = fields if any(v is not None for v in fields.values()) else None
+    return rec
+
+
+class OutputWriter:
+    """
+    Buffered writer for result records; the format follows the file suffix
+    (.jsonl, .jsonl.gz, .jsonl.zst, .parquet) unless `fmt` is given.
+
+        with OutputWriter("data/results.jsonl.zst") as out:
+            out.write(record)
+
+    JSONL lines are encoded as records arrive and written in chunks once
+    `buffer_records` are pending or `flush_s` seconds have passed, so a run
+    that is killed loses at most that much. Parquet rows are written as row
+    groups of `buffer_records` (default 4096); fields outside the fixed
+    column layout are not exported. `append` adds to an existing JSONL file
+    (compressed files get a new gzip member / zstd frame, which readers
+    handle transparently); Parquet files cannot be appended to.
+    """
+
+    def __init__(self, path: str, *, fmt: Optional[str] = None, buffer_records: Optional[int] = None,
+                 flush_s: float = 5.0, level: Optional[int] = None, append: bool = False):
+        self.path = Path(path)
+        self.fmt = fmt or detect_format(path)
+        if self.fmt not in FORMATS:
+            raise ValueError(f"unknown output format {self.fmt!r}; expected one of {FORMATS}")
+        self.buffer_records = buffer_records or (4096 if self.fmt == "parquet" else 256)
+        self.flush_s = flush_s
+        self.records = 0
+        self._buf: List[Any] = []
+        self._last_flush = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._raw: Optional[IO[bytes]] = None
+        self._fh: Any = None
+        self._pq_writer: Any = None
+        mode = "ab" if append else "wb"
+        if append and self.fmt == "parquet":
+            raise ValueError("Parquet output cannot be appended to; write JSONL and convert with `python -m src.output`")
+        if self.fmt == "jsonl":
+            self._fh = self._raw = open(self.path, mode)
+        elif self.fmt == "jsonl.gz":
+            self._raw = open(self.path, mode)
+            self._fh = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=level or 6)
+        elif self.fmt == "jsonl.zst":
+            self._raw = open(self.path, mode)
+            self._fh = _zstd().ZstdCompressor(level=level or 3).stream_writer(self._raw, closefd=False)
+        else:
+            pa, pq = _arrow()
+            self._schema = _arrow_schema(pa)
+            self._pq_writer = pq.ParquetWriter(str(self.path), self._schema, compression="zstd")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._buf.append(_flatten(record) if self.fmt == "parquet" else dumps(record))
+        self.records += 1
+        if len(self._buf) >= self.buffer_records or (
+                self.fmt != "parquet" and time.monotonic() - self._last_flush >= self.flush_s):
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        for r in records:
+            self.write(r)
+
+    def flush(self) -> None:
+        t0 = time.perf_counter()
+        if self._buf:
+            if self.fmt == "parquet":
+                pa, _ = _arrow()
+                self._pq_writer.write_table(pa.Table.from_pylist(self._buf, schema=self._schema))
+            else:
+                self._fh.write(b"".join(self._buf))
+                self._fh.flush()
+            metrics.incr("output.records", len(self._buf))
+            self._buf.clear()
+        self._last_flush = time.monotonic()
+        metrics.observe("output.flush", time.perf_counter() - t0)
+
+    def close(self) -> None:
+        self.flush()
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+        else:
+            if self._fh is not self._raw:
+                self._fh.close()
+            self._raw.close()  # type: ignore[union-attr]
+        metrics.incr("output.bytes", self.path.stat().st_size)
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _lines(path: Path, fmt: str) -> Iterator[bytes]:
+    if fmt == "jsonl.gz":
+        with gzip.open(path, "rb") as f:
+            yield from f
+    elif fmt == "jsonl.zst":
+        with open(path, "rb") as raw:
+            yield from io.BufferedReader(_zstd().ZstdDecompressor().stream_reader(raw, read_across_frames=True))
+    else:
+        with open(path, "rb") as f:
+            yield from f
+
+
+def read_records(path: str, *, limit: Optional[int] = None, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Records from any OutputWriter format, in file order. Blank or corrupt JSONL
+    lines are skipped, and a compressed file cut off mid-write yields the
+    records before the cut.
+    """
+    p = Path(path)
+    fmt = fmt or detect_format(path)
+    n = 0
+    if fmt == "parquet":
+        _, pq = _arrow()
+        for batch in pq.ParquetFile(str(p)).iter_batches():
+            for flat in batch.to_pylist():
+                if limit is not None and n >= limit:
+                    return
+                n += 1
+                yield _unflatten(flat)
+        return
+    try:
+        for line in _lines(p, fmt):
+            if limit is not None and n >= limit:
+                return
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = loads(line)
+            except ValueError:
+                continue
+            n += 1
+            yield rec
+    except EOFError:  # truncated gzip/zstd stream, e.g. a run still writing
+        return
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convert result files between output formats")
+    ap.add_argument("src", help="input file (.jsonl, .jsonl.gz, .jsonl.zst, .parquet)")
+    ap.add_argument("dst", help="output file; format follows the suffix")
+    args = ap.parse_args()
+    with OutputWriter(args.dst) as out:
+        out.write_many(read_records(args.src))
+    print(f"Wrote {out.records} records to {args.dst} ({Path(args.dst).stat().st_size / 1e3:.1f} kB)")
+
+
+if __name__ == "__main__":
+    main()
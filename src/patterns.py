@@ -0,0 +1,124 @@
+# Signal phrases per vertical: loaded from configs/verticals/*.yml once, compiled once, reloaded on edit
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+from src import metrics
+
+__all__ = ["DEFAULT_PHRASES", "PatternRegistry", "VerticalPatterns", "compile_any"]
+
+# used for any signal a vertical file does not list (and for unknown verticals)
+DEFAULT_PHRASES: Dict[str, List[str]] = {
+    "expansion": ["grand opening", "now open", "new location"],
+    "scheduler": ["calendly", "acuity", "book", "schedule", "appointment"],
+    "hiring":    ["hiring", "role", "apply", "careers", "jobs"],
+}
+
+
+@lru_cache(maxsize=512)
+def compile_any(patterns: Tuple[str, ...]) -> Optional[re.Pattern]:
+    """One case-insensitive alternation of `patterns` (None if empty); a phrase that is not a valid regex matches literally."""
+    if not patterns:
+        return None
+    return re.compile("|".join(_as_regex(p) for p in patterns), re.I)
+
+
+def _as_regex(phrase: str) -> str:
+    try:
+        re.compile(phrase)
+        return f"(?:{phrase})"
+    except re.error:
+        return re.escape(phrase)
+
+
+@dataclass
+class VerticalPatterns:
+    name: str
+    phrases: Dict[str, List[str]]
+    matchers: Dict[str, re.Pattern] = field(default_factory=dict)
+    hints: str = ""             # phrases as the JSON the validator prompt embeds; stable per vertical for prefix caching
+
+    @classmethod
+    def build(cls, name: str, config: Optional[dict] = None) -> "VerticalPatterns":
+        phrases = dict(DEFAULT_PHRASES)
+        for k, v in ((config or {}).get("phrases") or {}).items():
+            if v:
+                phrases[k] = [str(p) for p in ([v] if isinstance(v, str) else v)]
+        matchers = {k: rx for k, v in phrases.items() if (rx := compile_any(tuple(v))) is not None}
+        return cls(name, phrases, matchers, json.dumps(phrases, indent=2, sort_keys=True))
+
+    def signals_in(self, text: str) -> List[str]:
+        """Signals with at least one phrase in `text`."""
+        return [k for k, rx in self.matchers.items() if rx.search(text)]
+
+
+class PatternRegistry:
+    """
+    All vertical configs under `directory`, keyed by file stem:
+
+        registry.get("dentists").phrases     # {"expansion": [...], "scheduler": [...], ...}
+
+    Files are read and compiled once. At most every `check_s` seconds, get()
+    stats the directory and reloads files that were added, changed or
+    removed, so edits apply to the next domain of a running job. A vertical
+    without a file gets the defaults.
+    """
+
+    def __init__(self, directory: str = "configs/verticals", *, check_s: float = 5.0):
+        self.dir = Path(directory)
+        self.check_s = check_s
+        self._lock = threading.Lock()
+        self._mtimes: Dict[str, Tuple[Path, float]] = {}
+        self._verticals: Dict[str, VerticalPatterns] = {}
+        self._default = VerticalPatterns.build("default")
+        self._checked = 0.0
+        self.reload()
+
+    def _scan(self) -> Dict[str, Tuple[Path, float]]:
+        if not self.dir.is_dir():
+            return {}
+        found = {}
+        for p in self.dir.glob("*.y*ml"):
+            try:
+                found[p.stem] = (p, p.stat().st_mtime)
+            except OSError:  # removed mid-scan
+                continue
+        return found
+
+    def reload(self) -> None:
+        """Pick up added, changed and removed vertical files."""
+        mtimes = self._scan()
+        with self._lock:
+            self._checked = time.monotonic()
+            if mtimes == self._mtimes:
+                return
+            for name in set(self._verticals) - set(mtimes):
+                del self._verticals[name]
+            for name, (path, mtime) in mtimes.items():
+                if self._mtimes.get(name) == (path, mtime):
+                    continue
+                try:
+                    with open(path) as f:
+                        self._verticals[name] = VerticalPatterns.build(name, yaml.safe_load(f) or {})
+                except (OSError, yaml.YAMLError, AttributeError, TypeError, ValueError) as e:
+                    # half-written or malformed file (e.g. mid-edit); retried once its mtime changes again
+                    print(f"DEBUG PATTERNS: keeping previous patterns for {name}: {e}")
+                    continue
+                metrics.incr("patterns.loads")
+                print(f"DEBUG PATTERNS: loaded {path}")
+            self._mtimes = mtimes
+
+    def get(self, vertical: Optional[str]) -> VerticalPatterns:
+        if self.check_s >= 0 and time.monotonic() - self._checked >= self.check_s:
+            self.reload()
+        with self._lock:
+            return self._verticals.get(vertical or "", self._default)
@@ -0,0 +1,201 @@
+# Per-stage CPU (cProfile) and allocation (tracemalloc) profiling for graph nodes and tool calls
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from src import metrics
+
+__all__ = ["StageProfiler", "install", "stage"]
+
+# profiler bookkeeping is left out of the allocation tables
+_OWN_FILES = (tracemalloc.__file__, cProfile.__file__, pstats.__file__, __file__)
+
+
+class StageProfiler:
+    """
+    Aggregates cProfile stats, wall time and allocations per stage across domains.
+
+    A stage entered with a key (the domain) is profiled only if that key falls
+    in the sample, so all stages of a sampled domain are profiled together and
+    the rest pay for one crc32. A stage entered without a key (tool calls) is
+    profiled only when nested inside a sampled stage on the same thread; the
+    outer profiler is paused meanwhile, so each stage's stats are exclusive of
+    its nested stages. Allocation snapshots are taken for outermost stages only;
+    tracemalloc is process-wide, so with several workers a snapshot may include
+    allocations made concurrently by other domains.
+
+    Only one thread is profiled at a time: cProfile cannot run on several
+    threads at once from Python 3.12 (enable() raises ValueError). A sampled
+    stage that starts while another thread holds the profiler runs
+    unprofiled and is counted as skipped, so with several workers fewer
+    stage runs are profiled than sample_rate suggests.
+    """
+
+    def __init__(self, out_dir: str, *, sample_rate: float = 1.0, top_n: int = 25,
+                 trace_memory: bool = True, frames: int = 8):
+        self.out_dir = Path(out_dir)
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.trace_memory = trace_memory
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._calls: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])   # stage -> [calls, wall_s]
+        self._alloc: Dict[str, Counter] = defaultdict(Counter)               # stage -> {"file:line": bytes}
+        self._peak: Dict[str, int] = defaultdict(int)
+        self._tm_users = 0
+        self._sampled_runs = 0
+        self._skipped_runs = 0
+        self._active = threading.Lock()   # held by the one thread currently being profiled
+
+    def sampled(self, key: str) -> bool:
+        return zlib.crc32(key.encode()) % 10_000 < self.sample_rate * 10_000
+
+    @contextmanager
+    def stage(self, name: str, key: Optional[str] = None) -> Iterator[None]:
+        stack: list = getattr(self._local, "stack", None) or []
+        self._local.stack = stack
+        if key is None and not stack:
+            yield
+            return
+        if key is not None and not stack and not self.sampled(key):
+            yield
+            return
+
+        outermost = not stack
+        if outermost:
+            if not self._active.acquire(blocking=False):
+                with self._lock:
+                    self._skipped_runs += 1
+                metrics.incr("profile.skipped")
+                yield
+                return
+            with self._lock:
+                self._sampled_runs += 1
+        try:
+            with self._profiled(name, stack, outermost):
+                yield
+        finally:
+            if outermost:
+                self._active.release()
+
+    @contextmanager
+    def _profiled(self, name: str, stack: list, outermost: bool) -> Iterator[None]:
+        prof = cProfile.Profile()
+        if stack:
+            stack[-1].disable()
+        tracing = outermost and self.trace_memory and self._tm_start()
+        t0 = time.perf_counter()
+        stack.append(prof)
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            stack.pop()
+            wall = time.perf_counter() - t0
+            snap = peak = None
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                snap = tracemalloc.take_snapshot()
+                self._tm_stop()
+            self._record(name, prof, wall, snap, peak)
+            if stack:
+                stack[-1].enable()
+
+    def _tm_start(self) -> bool:
+        with self._lock:
+            if self._tm_users == 0:
+                tracemalloc.start(self.frames)
+            tracemalloc.reset_peak()
+            self._tm_users += 1
+        return True
+
+    def _tm_stop(self) -> None:
+        with self._lock:
+            self._tm_users -= 1
+            if self._tm_users == 0:
+                tracemalloc.stop()
+
+    def _record(self, name: str, prof: cProfile.Profile, wall: float,
+                snap: Optional[tracemalloc.Snapshot], peak: Optional[int]) -> None:
+        allocs = []
+        if snap is not None:
+            snap = snap.filter_traces([tracemalloc.Filter(False, f) for f in _OWN_FILES])
+            allocs = [(str(s.traceback[0]), s.size) for s in snap.statistics("lineno")[: self.top_n * 4]]
+        st = pstats.Stats(prof)
+        # while a nested stage runs, the paused outer profiler books that time to its own
+        # disable()/enable() calls; drop them so stats stay exclusive of nested stages
+        for func in [f for f in st.stats if "_lsprof.Profiler" in f[2]]:
+            del st.stats[func]
+        with self._lock:
+            if name in self._stats:
+                self._stats[name].add(st)
+            else:
+                self._stats[name] = st
+            c = self._calls[name]
+            c[0] += 1
+            c[1] += wall
+            for where, size in allocs:
+                self._alloc[name][where] += size
+            if peak is not None:
+                self._peak[name] = max(self._peak[name], peak)
+        metrics.observe(f"profile.{name}", wall)
+
+    def write(self) -> Path:
+        """Dump <stage>.pstats per stage plus report.txt with top-N hotspots and allocations."""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        out = io.StringIO()
+        with self._lock:
+            out.write(f"sampled stage runs: {self._sampled_runs} (domain sample rate {self.sample_rate}); "
+                      f"skipped while another thread was profiled: {self._skipped_runs}\n\n")
+            for name in sorted(self._stats, key=lambda n: -self._calls[n][1]):
+                calls, wall = self._calls[name]
+                st = self._stats[name]
+                st.dump_stats(str(self.out_dir / f"{name}.pstats"))
+                out.write(f"=== {name}: calls={int(calls)} wall={wall:.3f}s mean={wall / calls:.3f}s")
+                if name in self._peak:
+                    out.write(f" peak_traced={self._peak[name] / 1e6:.1f}MB")
+                out.write("\n")
+                for sort in ("tottime", "cumulative"):
+                    buf = io.StringIO()
+                    st.stream = buf
+                    st.sort_stats(sort).print_stats(self.top_n)
+                    body = buf.getvalue()
+                    # drop the pstats preamble, keep the table
+                    out.write(f"--- top {self.top_n} by {sort}\n")
+                    out.write(body[body.find("   ncalls"):] if "   ncalls" in body else body)
+                if self._alloc.get(name):
+                    out.write(f"--- top {self.top_n} allocation sites (bytes still live at stage end, summed)\n")
+                    for where, size in self._alloc[name].most_common(self.top_n):
+                        out.write(f"{size / 1e6:10.2f} MB  {where}\n")
+                out.write("\n")
+        path = self.out_dir / "report.txt"
+        path.write_text(out.getvalue())
+        return path
+
+
+_PROFILER: Optional[StageProfiler] = None
+
+
+def install(profiler: Optional[StageProfiler]) -> None:
+    """Make profiler visible to stage() callers such as execute_tool."""
+    global _PROFILER
+    _PROFILER = profiler
+
+
+def stage(name: str, key: Optional[str] = None):
+    """Profile a block under the installed profiler; no-op when profiling is off."""
+    p = _PROFILER
+    return p.stage(name, key) if p is not None else nullcontext()
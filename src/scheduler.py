@@ -0,0 +1,140 @@
+# Yield-aware domain ordering: per-domain scan history and an expected-signals-per-hour score
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src import jsonfile, metrics
+
+__all__ = ["DomainHistory", "ScheduleConfig", "expected_yield", "prioritize"]
+
+
+@dataclass
+class ScheduleConfig:
+    prior_weight: float = 2.0     # pseudo-scans pulling a domain's hit rate towards its vertical's
+    refresh_days: float = 7.0     # how fast a scanned domain becomes worth re-scanning
+    default_cost_s: float = 60.0  # assumed compute per domain before anything was measured
+    default_confidence: float = 0.6
+
+
+class DomainHistory:
+    """
+    Outcome of past scans per domain, persisted as JSON between runs:
+    scans, hits (card produced), summed card confidence, partial (budget-cut)
+    scans, an EWMA of seconds spent, and when it was last scanned / last hit.
+
+    save() merges with whatever is on disk, keeping the newer entry per domain,
+    so several worker processes can share one history file.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._domains: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path or not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text()).get("domains", {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"DEBUG HISTORY: ignoring unreadable history {self.path}: {e}")
+            return {}
+
+    def get(self, domain: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            e = self._domains.get(domain)
+            return dict(e) if e else None
+
+    def record(self, domain: str, *, vertical: Optional[str], hit: bool, confidence: float = 0.0,
+               elapsed_s: float = 0.0, partial: bool = False, now: Optional[float] = None) -> None:
+        now = now or time.time()
+        with self._lock:
+            e = self._domains.setdefault(domain, {"scans": 0, "hits": 0, "conf_sum": 0.0, "partials": 0,
+                                                  "cost_s": None, "last_scan": None, "last_hit": None})
+            e["vertical"] = vertical
+            e["scans"] += 1
+            e["partials"] += int(partial)
+            if hit:
+                e["hits"] += 1
+                e["conf_sum"] += confidence
+                e["last_hit"] = now
+            e["cost_s"] = elapsed_s if e["cost_s"] is None else 0.7 * e["cost_s"] + 0.3 * elapsed_s
+            e["last_scan"] = now
+
+    def vertical_stats(self) -> Dict[Optional[str], Dict[str, float]]:
+        """Summed scans/hits/confidence/cost per vertical, the prior for unscanned domains."""
+        out: Dict[Optional[str], Dict[str, float]] = {}
+        with self._lock:
+            for e in self._domains.values():
+                v = out.setdefault(e.get("vertical"), {"scans": 0, "hits": 0, "conf_sum": 0.0, "cost_sum": 0.0, "costed": 0})
+                v["scans"] += e["scans"]
+                v["hits"] += e["hits"]
+                v["conf_sum"] += e["conf_sum"]
+                if e.get("cost_s"):
+                    v["cost_sum"] += e["cost_s"]
+                    v["costed"] += 1
+        return out
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        def _merge(disk: Dict[str, Any]) -> Dict[str, Any]:
+            with self._lock:
+                self._domains = jsonfile.merge_newest(disk.get("domains") or {}, self._domains, ts="last_scan")
+                return {"domains": dict(self._domains)}
+
+        # read-merge-replace under an inter-process lock, so concurrent workers never drop each other's domains
+        jsonfile.update(self.path, _merge, label="HISTORY")
+
+
+def expected_yield(entry: Optional[Dict[str, Any]], prior: Dict[str, float],
+                   cfg: ScheduleConfig, now: Optional[float] = None) -> float:
+    """
+    Expected confident signals per compute hour for one domain:
+
+        P(hit) * E[confidence | hit] * freshness / expected seconds * 3600
+
+    P(hit) is the domain's hit rate shrunk towards its vertical's (Beta prior
+    with `prior_weight` pseudo-scans), freshness is 1 for never-scanned domains
+    and 1 - exp(-age / refresh_days) otherwise, and cost is the domain's own
+    EWMA of seconds spent, else the vertical's mean.
+    """
+    now = now or time.time()
+    p_prior = (prior.get("hits", 0) + 1) / (prior.get("scans", 0) + 2)
+    c_prior = prior["conf_sum"] / prior["hits"] if prior.get("hits") else cfg.default_confidence
+    cost_prior = prior["cost_sum"] / prior["costed"] if prior.get("costed") else cfg.default_cost_s
+    if not entry:
+        return p_prior * c_prior / cost_prior * 3600
+
+    p_hit = (entry["hits"] + cfg.prior_weight * p_prior) / (entry["scans"] + cfg.prior_weight)
+    conf = entry["conf_sum"] / entry["hits"] if entry["hits"] else c_prior
+    age_days = (now - (entry.get("last_scan") or 0)) / 86400
+    fresh = 1.0 - math.exp(-max(0.0, age_days) / cfg.refresh_days)
+    cost = max(1.0, entry.get("cost_s") or cost_prior)
+    return p_hit * conf * fresh / cost * 3600
+
+
+def prioritize(rows: Iterable[Dict[str, str]], history: DomainHistory, *, default_vertical: Optional[str] = None,
+               cfg: Optional[ScheduleConfig] = None, now: Optional[float] = None) -> List[Dict[str, str]]:
+    """Rows sorted by expected_yield, best first (stable for equal scores, e.g. a cold history)."""
+    cfg = cfg or ScheduleConfig()
+    now = now or time.time()
+    priors = history.vertical_stats()
+    scored = []
+    for row in rows:
+        vertical = row.get("vertical") or default_vertical
+        score = expected_yield(history.get(row["domain"]), priors.get(vertical, {}), cfg, now)
+        scored.append((score, row))
+    scored.sort(key=lambda t: -t[0])
+    if scored:
+        metrics.gauge("schedule.top_yield", scored[0][0])
+        print(f"DEBUG SCHEDULE: ordered {len(scored)} domains; top {scored[0][1]['domain']} "
+              f"({scored[0][0]:.2f} signals/h), bottom {scored[-1][1]['domain']} ({scored[-1][0]:.2f} signals/h)")
+    return [row for _, row in scored]
@@ -28,11 +28,20 @@ class EvidenceCard(BaseModel):
     location_guess: Optional[str] = None
 
 
+class PageDoc(BaseModel):
+    """Compact page kept in pipeline state; the raw HTML lives in the blob store."""
+    url: Optional[str] = None
+    blob_id: Optional[str] = None       # sha256 of the HTML, also its content fingerprint
+    text: str = ""
+    published_at: Optional[datetime] = None
+
+
 class ScrapeResult(BaseModel):
     ok: bool
     why: List[str] = []
-    pages: Dict[str, str] = {}         
+    pages: Dict[str, str] = {}          # raw HTML as returned by the model; compacted into docs
     urls: Dict[str, HttpUrl] = {}       
+    docs: Dict[str, PageDoc] = {}
 
 class ValidateResult(BaseModel):
     ok: bool
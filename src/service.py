@@ -0,0 +1,303 @@
+"""Resident scan service: one warm graph, answering domain-scan jobs over local HTTP.
+
+Startup pays for imports, config, graph compilation and model warm-up once;
+each job then costs only its fetches and LLM calls. Jobs are asynchronous:
+
+    POST /jobs        {"domains": [{"domain": "acme.com", "company": "Acme", "vertical": "dentists"}],
+                       "wait": 30}                      -> 202 {"id": ..., "status": "queued", ...}
+                      ("domain": "acme.com" for a single one; with "wait" the reply is held up to that
+                       many seconds and is 200 with the results if the job finished by then)
+    GET  /jobs/<id>   -> {"id", "status": queued|running|done|failed, "results": [...], ...}
+    GET  /health      -> {"ok": true, "uptime_s", "jobs": {status: count}, "workers", "interactive_workers"}
+    GET  /metrics     -> src.metrics snapshot
+
+Results are the same records the CSV runner writes. Serve on TCP or a Unix socket:
+
+    python -m src.service --port 8765 --workers 4
+    python -m src.service --socket /tmp/evidenceflow.sock
+    curl --unix-socket /tmp/evidenceflow.sock -d '{"domain": "acme.com", "wait": 60}' http://x/jobs
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from src import metrics
+from src.app import fill_drafts, run_row, schedule_setup
+from src.graph import make_drafter, make_graph
+from src.tools import hostcache, httpcache
+
+__all__ = ["ServiceConfig", "ScanService", "serve"]
+
+
+@dataclass
+class ServiceConfig:
+    host: str = "127.0.0.1"
+    port: int = 8765
+    socket: Optional[str] = None      # Unix socket path; replaces host/port
+    workers: int = 4                  # domains scanned concurrently, across all bulk jobs
+    interactive_workers: int = 2      # separate lane for small jobs, so they never queue behind bulk ones; 0 = shared
+    small_job_max: int = 3            # jobs with at most this many domains take the interactive lane
+    max_jobs: int = 1000              # finished jobs kept for polling, oldest dropped first
+    max_domains_per_job: int = 500
+    vertical: str = "dentists"        # for rows without a `vertical`
+    save_s: float = 60.0              # how often caches and history are written back
+
+
+def _load_service_config(config_path: str = "configs/config.yml") -> ServiceConfig:
+    with open(config_path) as f:
+        block = (yaml.safe_load(f) or {}).get("service") or {}
+    return ServiceConfig(**{k: v for k, v in block.items() if k in ServiceConfig.__dataclass_fields__})
+
+
+class ScanService:
+    """
+    The warm graph plus a job table. submit() queues a job and returns at
+    once. Jobs of up to small_job_max domains run in an interactive lane
+    with its own threads; larger jobs share the bulk lane, first come first
+    served. A one-domain lookup therefore waits only for other small jobs,
+    never for a 500-domain batch. A job's deferred drafts are batched when
+    its last domain finishes.
+    """
+
+    def __init__(self, cfg: ServiceConfig, *, domain_budget: Optional[float] = None):
+        self.cfg = cfg
+        self.started = time.time()
+        t0 = time.perf_counter()
+        self.history, _, self.budget_s = schedule_setup(domain_budget)
+        self.drafter = make_drafter()
+        self.graph = make_graph(vertical=cfg.vertical, drafter=self.drafter)
+        metrics.observe("service.startup", time.perf_counter() - t0)
+        print(f"DEBUG SERVICE: graph ready in {time.perf_counter() - t0:.2f}s")
+        # lane -> (job runners, domain scanners)
+        self._lanes = {"bulk": (ThreadPoolExecutor(max_workers=max(1, cfg.workers), thread_name_prefix="job"),
+                                ThreadPoolExecutor(max_workers=max(1, cfg.workers), thread_name_prefix="scan"))}
+        if cfg.interactive_workers > 0:
+            n = cfg.interactive_workers
+            self._lanes["interactive"] = (ThreadPoolExecutor(max_workers=n, thread_name_prefix="ijob"),
+                                          ThreadPoolExecutor(max_workers=n, thread_name_prefix="iscan"))
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._done: Dict[str, threading.Event] = {}
+        self._last_save = time.monotonic()
+
+    def submit(self, rows: List[Dict[str, str]]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex[:12]
+        lane = "interactive" if "interactive" in self._lanes and len(rows) <= self.cfg.small_job_max else "bulk"
+        job = {"id": job_id, "status": "queued", "domains": [r["domain"] for r in rows], "lane": lane,
+               "submitted": time.time(), "started": None, "finished": None, "results": [], "error": None}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._done[job_id] = threading.Event()
+            self._evict()
+        metrics.incr("service.jobs")
+        metrics.incr(f"service.jobs_{lane}")
+        jobs_pool, domains = self._lanes[lane]
+        jobs_pool.submit(self._run_job, job_id, rows, domains)
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return {**job, "results": list(job["results"])} if job else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        ev = self._done.get(job_id)
+        if ev is not None:
+            ev.wait(timeout)
+        return self.get(job_id)
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for j in self._jobs.values():
+                counts[j["status"]] = counts.get(j["status"], 0) + 1
+        return {"ok": True, "uptime_s": round(time.time() - self.started, 1), "jobs": counts,
+                "workers": self.cfg.workers, "interactive_workers": self.cfg.interactive_workers}
+
+    def _run_job(self, job_id: str, rows: List[Dict[str, str]], domains: ThreadPoolExecutor) -> None:
+        self._update(job_id, status="running", started=time.time())
+        t0 = time.perf_counter()
+        records: List[Dict[str, Any]] = []
+        try:
+            records = list(domains.map(self._run_domain, rows))
+            fill_drafts(self.drafter, records)
+            self._update(job_id, status="done", results=records, finished=time.time())
+        except Exception as e:
+            # only batched drafting gets here; the scanned records are still returned, minus their emails
+            print(f"DEBUG SERVICE: job {job_id} failed: {e}")
+            metrics.incr("service.jobs_failed")
+            self._update(job_id, status="failed", results=records, error=str(e), finished=time.time())
+        finally:
+            metrics.observe("service.job", time.perf_counter() - t0)
+            self._done[job_id].set()
+            self._maybe_save()
+
+    def _run_domain(self, row: Dict[str, str]) -> Dict[str, Any]:
+        """One domain's record; a failing domain gets an error record (as in merged queue output) instead of sinking the job."""
+        try:
+            return run_row(self.graph, row, vertical=self.cfg.vertical, history=self.history, budget_s=self.budget_s)
+        except Exception as e:
+            print(f"DEBUG SERVICE: {row['domain']} failed: {e}")
+            metrics.incr("service.domains_failed")
+            return {"domain": row["domain"], "company": row.get("company"), "vertical": row.get("vertical"),
+                    "card": None, "email": None, "error": str(e)}
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _evict(self) -> None:
+        # caller holds the lock; unfinished jobs are never dropped
+        finished = [k for k, j in self._jobs.items() if j["status"] in ("done", "failed")]
+        for k in finished[:max(0, len(self._jobs) - self.cfg.max_jobs)]:
+            del self._jobs[k]
+            self._done.pop(k, None)
+
+    def _maybe_save(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._last_save < self.cfg.save_s:
+                return
+            self._last_save = time.monotonic()
+        self.save()
+
+    def save(self) -> None:
+        hostcache.save()
+        httpcache.save()
+        self.history.save()
+
+    def close(self) -> None:
+        for jobs_pool, domains in self._lanes.values():
+            jobs_pool.shutdown(wait=True)
+            domains.shutdown(wait=True)
+        self.save()
+
+
+def _parse_rows(body: Dict[str, Any]) -> List[Dict[str, str]]:
+    items = body.get("domains")
+    if items is None and body.get("domain"):
+        items = [{k: body[k] for k in ("domain", "company", "vertical") if body.get(k)}]
+    if not isinstance(items, list) or not items:
+        raise ValueError('expected "domain" or a non-empty "domains" list')
+    rows = []
+    for it in items:
+        row = {"domain": it} if isinstance(it, str) else it
+        if not isinstance(row, dict) or not isinstance(row.get("domain"), str) or not row["domain"].strip():
+            raise ValueError(f"invalid domain entry: {it!r}")
+        rows.append({k: str(v) for k, v in row.items() if v is not None})
+    return rows
+
+
+class _Handler(BaseHTTPRequestHandler):
+    @property
+    def service(self) -> ScanService:
+        return self.server.service  # type: ignore[attr-defined]
+
+    def log_message(self, *args):  # the scan itself logs plenty
+        pass
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, self.service.health())
+        elif self.path == "/metrics":
+            self._reply(200, metrics.snapshot())
+        elif self.path.startswith("/jobs/"):
+            job = self.service.get(self.path[len("/jobs/"):])
+            if job is None:
+                self._reply(404, {"error": "unknown job"})
+            else:
+                self._reply(200, job)
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            rows = _parse_rows(body)
+            if len(rows) > self.service.cfg.max_domains_per_job:
+                raise ValueError(f"at most {self.service.cfg.max_domains_per_job} domains per job")
+            wait = float(body.get("wait") or 0)
+        except (ValueError, TypeError, AttributeError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        job = self.service.submit(rows)
+        if wait > 0:
+            job = self.service.wait(job["id"], wait) or job
+        self._reply(200 if job["status"] in ("done", "failed") else 202, job)
+
+    def _reply(self, code: int, data: Any) -> None:
+        raw = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(cfg: ServiceConfig, *, domain_budget: Optional[float] = None) -> None:
+    service = ScanService(cfg, domain_budget=domain_budget)
+    if cfg.socket:
+        if os.path.exists(cfg.socket):
+            os.unlink(cfg.socket)
+        server: socketserver.BaseServer = _UnixHTTPServer(cfg.socket, _Handler)
+        where = f"unix:{cfg.socket}"
+    else:
+        server = ThreadingHTTPServer((cfg.host, cfg.port), _Handler)
+        server.daemon_threads = True  # type: ignore[attr-defined]
+        where = f"http://{cfg.host}:{cfg.port}"
+    server.service = service  # type: ignore[attr-defined]
+    # SIGTERM (service managers, `kill`) shuts down like Ctrl-C; shutdown() must run off the serving thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"Serving scan jobs on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        server.server_close()
+        if cfg.socket and os.path.exists(cfg.socket):
+            os.unlink(cfg.socket)
+        service.close()
+        print("Run metrics:\n" + metrics.report())
+
+
+def main() -> None:
+    cfg = _load_service_config()
+    ap = argparse.ArgumentParser(description="Resident scan service with a warm graph")
+    ap.add_argument("--host", default=cfg.host)
+    ap.add_argument("--port", type=int, default=cfg.port)
+    ap.add_argument("--socket", default=cfg.socket, help="serve on this Unix socket instead of TCP")
+    ap.add_argument("--workers", type=int, default=cfg.workers, help="domains scanned concurrently by bulk jobs")
+    ap.add_argument("--interactive-workers", type=int, default=cfg.interactive_workers,
+                    help="separate threads for jobs of at most service.small_job_max domains (0 = share the bulk pool)")
+    ap.add_argument("--vertical", default=cfg.vertical, help="for domains submitted without one")
+    ap.add_argument("--domain-budget", type=float, metavar="S",
+                    help="wall-clock seconds per domain (overrides schedule.domain_budget_s)")
+    args = ap.parse_args()
+    cfg.host, cfg.port, cfg.socket, cfg.workers, cfg.vertical = args.host, args.port, args.socket, args.workers, args.vertical
+    cfg.interactive_workers = args.interactive_workers
+    serve(cfg, domain_budget=args.domain_budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# src/tools/blobstore.py
+# Content-addressed, gzip-compressed on-disk store for raw page HTML, so the
+# pipeline state only carries a blob id.
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from src import metrics
+
+__all__ = ["BlobStore", "blob_id", "configure", "current"]
+
+
+def blob_id(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8", "replace")).hexdigest()
+
+
+class BlobStore:
+    """
+    put(html) -> id writes <root>/<id[:2]>/<id>.html.gz once per distinct body;
+    get(id) -> html reads it back (e.g. for re-extraction or debugging).
+    """
+
+    def __init__(self, root: str, *, level: int = 6):
+        self.root = Path(root)
+        self.level = level
+
+    def _path(self, bid: str) -> Path:
+        return self.root / bid[:2] / f"{bid}.html.gz"
+
+    def has(self, bid: str) -> bool:
+        return self._path(bid).exists()
+
+    def put(self, html: str, bid: Optional[str] = None) -> str:
+        bid = bid or blob_id(html)
+        path = self._path(bid)
+        if path.exists():
+            metrics.incr("blobs.dedup")
+            return bid
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = gzip.compress(html.encode("utf-8", "replace"), compresslevel=self.level)
+        # unique tmp per writer: threads/processes storing the same body must not share one
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{bid}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # same content either way, so losing a race to another writer is fine
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            if not path.exists():
+                raise
+            metrics.incr("blobs.dedup")
+            return bid
+        metrics.incr("blobs.written")
+        metrics.incr("blobs.bytes", len(data))
+        return bid
+
+    def get(self, bid: str) -> Optional[str]:
+        path = self._path(bid)
+        if not path.exists():
+            return None
+        return gzip.decompress(path.read_bytes()).decode("utf-8")
+
+
+_STORE: Optional[BlobStore] = None
+
+
+def configure(root: Optional[str]) -> Optional[BlobStore]:
+    """Set the process-wide store; None disables spilling (HTML is just dropped)."""
+    global _STORE
+    _STORE = BlobStore(root) if root else None
+    return _STORE
+
+
+def current() -> Optional[BlobStore]:
+    return _STORE
@@ -0,0 +1,133 @@
+# src/tools/dates.py
+# Fast date parsing for page metadata. ISO-8601, RFC-2822 and "Month D, YYYY"
+# style strings are handled with the stdlib; dateparser (slow to import and to
+# call) is only loaded for whatever is left.
+from __future__ import annotations
+
+import re
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from src import metrics
+
+__all__ = ["parse_date", "extract_dates", "pick_published"]
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+_MON = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_ORD = r"(?:st|nd|rd|th)?"
+_MDY = re.compile(rf"^{_MON}\s+(\d{{1,2}}){_ORD},?\s+(\d{{4}})$", re.I)
+_DMY = re.compile(rf"^(\d{{1,2}}){_ORD}\s+(?:of\s+)?{_MON},?\s+(\d{{4}})$", re.I)
+_ISO_HEAD = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_RFC_HEAD = re.compile(r"^(?:[a-z]{3},\s*)?\d{1,2}\s+[a-z]{3}\s+\d{4}\s+\d{1,2}:\d{2}", re.I)
+
+# dates found in running text
+_TEXT_DATE = re.compile(
+    rf"\b(?:{_MON}\s+\d{{1,2}}{_ORD},?\s+\d{{4}}|\d{{1,2}}{_ORD}\s+{_MON}\s+\d{{4}}|\d{{4}}-\d{{2}}-\d{{2}})\b",
+    re.I,
+)
+
+# meta keys, most to least trustworthy for published_at
+_META_PUBLISHED = ("article:published_time", "og:published_time", "datepublished", "date", "dc.date", "pubdate", "publishdate")
+_META_MODIFIED = ("article:modified_time", "og:updated_time", "datemodified", "last-modified")
+
+# source priority: lower wins
+META_PUBLISHED, TIME_TAG, META_MODIFIED, TEXT = 0, 1, 2, 3
+
+
+def _aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _fast(s: str) -> Optional[datetime]:
+    if _ISO_HEAD.match(s):
+        try:
+            return datetime.fromisoformat(s.replace("Z", "+00:00").replace("z", "+00:00"))
+        except ValueError:
+            pass
+    if _RFC_HEAD.match(s):
+        try:
+            return parsedate_to_datetime(s)
+        except (TypeError, ValueError):
+            pass
+    m = _MDY.match(s)
+    if m:
+        mon, day, year = m.group(1), m.group(2), m.group(3)
+    else:
+        m = _DMY.match(s)
+        if not m:
+            return None
+        day, mon, year = m.group(1), m.group(2), m.group(3)
+    try:
+        return datetime(int(year), _MONTHS[mon[:3].lower()], int(day))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _fast_cached(s: str) -> Optional[datetime]:
+    dt = _fast(s)
+    return _aware(dt) if dt is not None else None
+
+
+def parse_date(raw: str) -> Optional[datetime]:
+    """
+    Parse a date string to an aware datetime (naive values are taken as UTC).
+    Absolute formats are memoized; dateparser results are not, since relative
+    strings ("yesterday", "2 days ago") go stale in long-running processes.
+    """
+    s = " ".join(raw.split())
+    if not s:
+        return None
+    dt = _fast_cached(s)
+    if dt is not None:
+        metrics.incr("dates.fast")
+        return dt
+    metrics.incr("dates.fallback")
+    import dateparser  # heavy; only needed for unusual formats
+    dt = dateparser.parse(s)
+    return _aware(dt) if dt else None
+
+
+def extract_dates(html: str) -> List[Tuple[datetime, int, str]]:
+    """
+    Every date on the page in one pass: (datetime, source priority, raw string)
+    from published/modified meta tags, <time> elements and dates in the text.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    found: List[Tuple[datetime, int, str]] = []
+
+    def add(raw: Optional[str], prio: int) -> None:
+        if raw:
+            dt = parse_date(raw)
+            if dt:
+                found.append((dt, prio, raw))
+
+    for el in soup.find_all(["meta", "time"]):
+        if el.name == "time":
+            add(el.get("datetime") or el.get_text(strip=True), TIME_TAG)
+            continue
+        key = (el.get("property") or el.get("name") or el.get("itemprop") or "").lower()
+        if key in _META_PUBLISHED:
+            add(el.get("content"), META_PUBLISHED)
+        elif key in _META_MODIFIED:
+            add(el.get("content"), META_MODIFIED)
+
+    for m in _TEXT_DATE.finditer(soup.get_text(" ", strip=True)):
+        add(m.group(0), TEXT)
+    return found
+
+
+def pick_published(dates: List[Tuple[datetime, int, str]], *, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Best published_at guess: most trusted source, then most recent date not in the future."""
+    now = now or datetime.now(timezone.utc)
+    horizon = now + timedelta(days=1)
+    usable = [d for d in dates if d[0] <= horizon]
+    if not usable:
+        return None
+    best_prio = min(d[1] for d in usable)
+    return max(d[0] for d in usable if d[1] == best_prio)
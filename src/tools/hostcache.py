@@ -0,0 +1,209 @@
+# src/tools/hostcache.py
+# Per-host metadata cache: canonical origin after redirects, permanent path
+# redirects and DNS answers, persisted as JSON between runs.
+from __future__ import annotations
+
+import ipaddress
+import json
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from src import jsonfile, metrics
+
+__all__ = ["HostCache", "configure", "current", "save"]
+
+PERMANENT = {301, 308}
+
+
+def _origin(url: str) -> str:
+    p = urlsplit(url)
+    return f"{p.scheme}://{p.netloc}".lower()
+
+
+def _path(url: str) -> str:
+    p = urlsplit(url)
+    return urlunsplit(("", "", p.path or "/", p.query, ""))
+
+
+def _bare_host(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _origin_move(requested: str, final: str) -> bool:
+    """A redirect that only changes scheme/host: same path and query, or "/" to the same site's www/apex twin."""
+    if _path(requested) == _path(final):
+        return True
+    return _path(requested) == "/" and _bare_host(requested) == _bare_host(final)
+
+
+def _is_ip(host: Any) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+class HostCache:
+    """
+    Remembers, per origin, where it ends up after redirects (http->https,
+    apex->www) so later paths on the same host are requested at the final
+    origin directly, and caches getaddrinfo answers for dns_ttl seconds.
+
+        cache.rewrite("http://example.com/jobs")  # -> "https://www.example.com/jobs"
+        cache.learn(requested_url, resp.url, [r.status_code for r in resp.history])
+    """
+
+    def __init__(self, path: Optional[str] = None, *, origin_ttl: float = 7 * 86400, dns_ttl: float = 300):
+        self.path = Path(path) if path else None
+        self.origin_ttl = origin_ttl
+        self.dns_ttl = dns_ttl
+        self._origins: Dict[str, Dict[str, Any]] = {}    # origin -> {"to": origin, "ts": epoch}
+        self._redirects: Dict[str, Dict[str, Any]] = {}  # url -> {"to": url, "ts": epoch}
+        self._dns: Dict[str, Dict[str, Any]] = {}        # "host|port|family|type|proto|flags" -> {"addrs": [...], "ts": epoch}
+        # dropped by forget() since the last save, so the merge does not restore them from disk; learn() clears them
+        self._forgotten_urls: set = set()
+        self._forgotten_origins: set = set()
+        self._lock = threading.Lock()
+        self.load()
+
+    # ---- redirects / canonical origin ----
+
+    def rewrite(self, url: str) -> str:
+        now = time.time()
+        with self._lock:
+            hit = self._redirects.get(url)
+            if hit and now - hit["ts"] < self.origin_ttl:
+                metrics.incr("hostcache.redirect_hits")
+                return hit["to"]
+            origin = _origin(url)
+            hit = self._origins.get(origin)
+            if hit and now - hit["ts"] < self.origin_ttl and hit["to"] != origin:
+                metrics.incr("hostcache.origin_hits")
+                return hit["to"] + _path(url)
+        return url
+
+    def learn(self, requested: str, final: str, history_codes: List[int]) -> None:
+        """
+        Record the outcome of a fetch. A permanent redirect that only moves the
+        origin (same path and query, or "/" to the www/apex twin) is cached for
+        the whole origin; any other permanent redirect only for that URL, so a
+        page bouncing to a third-party site does not drag the host along.
+        """
+        now = time.time()
+        src_origin, dst_origin = _origin(requested), _origin(final)
+        permanent = bool(history_codes) and all(c in PERMANENT for c in history_codes)
+        with self._lock:
+            if not history_codes or src_origin == dst_origin:
+                self._set_origin(src_origin, src_origin, now)
+            elif permanent and _origin_move(requested, final):
+                self._set_origin(src_origin, dst_origin, now)
+                self._set_origin(dst_origin, dst_origin, now)
+                return
+            if permanent and requested != final:
+                self._redirects[requested] = {"to": final, "ts": now}
+                self._forgotten_urls.discard(requested)
+
+    def _set_origin(self, origin: str, to: str, now: float) -> None:
+        # caller holds the lock
+        self._origins[origin] = {"to": to, "ts": now}
+        self._forgotten_origins.discard(origin)
+
+    def forget(self, url: str) -> None:
+        with self._lock:
+            self._redirects.pop(url, None)
+            self._origins.pop(_origin(url), None)
+            self._forgotten_urls.add(url)
+            self._forgotten_origins.add(_origin(url))
+
+    # ---- DNS ----
+
+    def getaddrinfo(self, resolver, host, port, family=0, type=0, proto=0, flags=0):
+        if not host or _is_ip(host):
+            return resolver(host, port, family, type, proto, flags)
+        key = f"{host}|{port}|{int(family)}|{int(type)}|{proto}|{flags}"
+        now = time.time()
+        with self._lock:
+            hit = self._dns.get(key)
+        if hit and now - hit["ts"] < self.dns_ttl:
+            metrics.incr("dns.hits")
+            return [
+                (socket.AddressFamily(f), socket.SocketKind(t), p, canon, tuple(sa))
+                for f, t, p, canon, sa in hit["addrs"]
+            ]
+        metrics.incr("dns.misses")
+        res = resolver(host, port, family, type, proto, flags)
+        with self._lock:
+            self._dns[key] = {"addrs": [[int(f), int(t), p, canon, list(sa)] for f, t, p, canon, sa in res], "ts": now}
+        return res
+
+    # ---- persistence ----
+
+    def load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"DEBUG HOSTCACHE: ignoring unreadable cache {self.path}: {e}")
+            return
+        self._origins = data.get("origins", {})
+        self._redirects = data.get("redirects", {})
+        self._dns = data.get("dns", {})
+
+    def save(self) -> None:
+        """Merge into the file on disk (newest entry per key wins), so worker processes sharing it keep each other's entries."""
+        if not self.path:
+            return
+        now = time.time()
+        ttls = {"origins": self.origin_ttl, "redirects": self.origin_ttl, "dns": self.dns_ttl}
+
+        def _merge(disk: Dict[str, Any]) -> Dict[str, Any]:
+            with self._lock:
+                mine = {"origins": self._origins, "redirects": self._redirects, "dns": self._dns}
+                data = {}
+                for section, ttl in ttls.items():
+                    merged = jsonfile.merge_newest(disk.get(section) or {}, mine[section])
+                    data[section] = {k: v for k, v in merged.items() if now - v["ts"] < ttl}
+                for url in self._forgotten_urls:
+                    data["redirects"].pop(url, None)
+                for origin in self._forgotten_origins:
+                    data["origins"].pop(origin, None)
+                self._forgotten_urls.clear()
+                self._forgotten_origins.clear()
+                self._origins, self._redirects, self._dns = (dict(data[k]) for k in ttls)
+                return data
+
+        jsonfile.update(self.path, _merge, label="HOSTCACHE")
+
+
+_CACHE: Optional[HostCache] = None
+_resolver = socket.getaddrinfo
+
+
+def _cached_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    if _CACHE is None:
+        return _resolver(host, port, family, type, proto, flags)
+    return _CACHE.getaddrinfo(_resolver, host, port, family, type, proto, flags)
+
+
+def configure(path: Optional[str] = None, *, origin_ttl: float = 7 * 86400, dns_ttl: float = 300) -> HostCache:
+    """Create the process-wide cache and route socket.getaddrinfo through it."""
+    global _CACHE
+    _CACHE = HostCache(path, origin_ttl=origin_ttl, dns_ttl=dns_ttl)
+    socket.getaddrinfo = _cached_getaddrinfo
+    return _CACHE
+
+
+def current() -> Optional[HostCache]:
+    return _CACHE
+
+
+def save() -> None:
+    if _CACHE is not None:
+        _CACHE.save()
@@ -0,0 +1,112 @@
+# src/tools/httpcache.py
+# Per-URL HTTP validators (ETag / Last-Modified) plus the blob id of the body
+# they describe, so revisits can be conditional requests answered with 304.
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src import jsonfile
+
+__all__ = ["ValidatorCache", "configure", "current", "save"]
+
+
+class ValidatorCache:
+    """
+    Remembers, per URL, the validators from the last 200 response and the
+    blob-store id of its body:
+
+        cache.headers_for(url)   # -> {"If-None-Match": ..., "If-Modified-Since": ...}
+        cache.learn(url, etag, last_modified, blob_id)
+
+    On a 304 the caller serves the body from the blob store by that id.
+    Entries older than ttl are dropped on save; save merges with the file on
+    disk, so processes sharing it do not lose each other's entries.
+    """
+
+    def __init__(self, path: Optional[str] = None, *, ttl: float = 30 * 86400):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self._urls: Dict[str, Dict[str, Any]] = {}   # url -> {"etag", "last_modified", "blob_id", "ts"}
+        self._forgotten: set = set()   # dropped since the last save; not restored from disk
+        self._lock = threading.Lock()
+        self.load()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            e = self._urls.get(url)
+            return dict(e) if e else None
+
+    def headers_for(self, url: str) -> Dict[str, str]:
+        e = self.get(url)
+        if not e:
+            return {}
+        h = {}
+        if e.get("etag"):
+            h["If-None-Match"] = e["etag"]
+        if e.get("last_modified"):
+            h["If-Modified-Since"] = e["last_modified"]
+        return h
+
+    def learn(self, url: str, etag: Optional[str], last_modified: Optional[str], blob_id: str) -> None:
+        with self._lock:
+            self._urls[url] = {"etag": etag, "last_modified": last_modified, "blob_id": blob_id, "ts": time.time()}
+            self._forgotten.discard(url)
+
+    def touch(self, url: str) -> None:
+        """A 304 confirmed the stored copy; keep it from expiring."""
+        with self._lock:
+            if url in self._urls:
+                self._urls[url]["ts"] = time.time()
+
+    def forget(self, url: str) -> None:
+        with self._lock:
+            self._urls.pop(url, None)
+            self._forgotten.add(url)
+
+    def load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            self._urls = json.loads(self.path.read_text()).get("urls", {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"DEBUG HTTPCACHE: ignoring unreadable cache {self.path}: {e}")
+
+    def save(self) -> None:
+        """Merge into the file on disk (newest entry per URL wins), so worker processes sharing it keep each other's entries."""
+        if not self.path:
+            return
+        now = time.time()
+
+        def _merge(disk: Dict[str, Any]) -> Dict[str, Any]:
+            with self._lock:
+                merged = jsonfile.merge_newest(disk.get("urls") or {}, self._urls)
+                for url in self._forgotten:
+                    merged.pop(url, None)
+                self._forgotten.clear()
+                self._urls = {k: v for k, v in merged.items() if now - v["ts"] < self.ttl}
+                return {"urls": dict(self._urls)}
+
+        jsonfile.update(self.path, _merge, label="HTTPCACHE")
+
+
+_CACHE: Optional[ValidatorCache] = None
+
+
+def configure(path: Optional[str] = None, *, ttl: float = 30 * 86400) -> ValidatorCache:
+    """Create the process-wide cache; fetch() sends conditional requests once a blob store is configured too."""
+    global _CACHE
+    _CACHE = ValidatorCache(path, ttl=ttl)
+    return _CACHE
+
+
+def current() -> Optional[ValidatorCache]:
+    return _CACHE
+
+
+def save() -> None:
+    if _CACHE is not None:
+        _CACHE.save()
@@ -0,0 +1,38 @@
+# src/tools/pages.py
+# Turn fetched HTML into the compact PageDoc kept in pipeline state.
+from __future__ import annotations
+
+from typing import Optional
+
+from src.schemas import PageDoc
+from src.tools import blobstore
+from src.tools.web import extract_date, extract_text
+
+__all__ = ["compact_page"]
+
+
+def compact_page(html: str, url: Optional[str] = None) -> PageDoc:
+    """
+    Extract what downstream nodes need (text, published date) while the HTML
+    is in hand, spill the HTML to the blob store and return a doc without it.
+    Callers should drop their reference to `html` afterwards.
+    """
+    bid = blobstore.blob_id(html)
+    store = blobstore.current()
+    if store is not None and not store.has(bid):  # fetch() usually stored it already
+        store.put(html, bid)
+    try:
+        text = extract_text(html)
+    except Exception as e:
+        print(f"DEBUG PAGES: text extraction failed for {url}: {e}")
+        text = ""
+    try:
+        published = extract_date(html)
+    except Exception:
+        published = None
+    return PageDoc(
+        url=url,
+        blob_id=bid,
+        text=text,
+        published_at=published,
+    )
@@ -1,16 +1,24 @@
 # src/tools/web.py
 from __future__ import annotations
 
+import codecs
+import hashlib
 import re
-from typing import Dict, Optional, Tuple
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
 
 import requests
 from bs4 import BeautifulSoup
 from readability import Document
-import dateparser
+
+from src import deadline, metrics
+from src.tools import blobstore, hostcache, httpcache
+from src.tools.dates import extract_dates, pick_published
 
 # Public API
-__all__ = ["fetch", "extract_text", "sentences", "extract_date"]
+__all__ = ["fetch", "probe", "configure_fetch", "budget_available", "FetchSkipped",
+           "extract_text", "sentences", "extract_date"]
 
 # ---- HTTP fetching ----
 
@@ -21,9 +29,123 @@ DEFAULT_HEADERS = {
     ),
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "en-US,en;q=0.7",
-    "Connection": "close",
 }
 
+# Bodies are read in chunks and cut off at max_bytes; anything whose
+# Content-Type is not listed is rejected from the headers alone.
+_FETCH_LIMITS = {
+    "max_bytes": 1_500_000,
+    "content_types": ("text/html", "application/xhtml+xml", "application/xml", "text/xml", "text/plain"),
+}
+_CHUNK = 64 * 1024
+_SNIFF_BYTES = 4096
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_:.-]+)""", re.I)
+_HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?([A-Za-z0-9_:.-]+)", re.I)
+
+
+class FetchSkipped(requests.RequestException):
+    """Response rejected from its headers (non-HTML content type)."""
+
+
+class _RequestBudget:
+    """Token bucket: `per_hour` requests, refilled continuously, bursts up to a tenth of that."""
+
+    def __init__(self, per_hour: float):
+        self.rate = per_hour / 3600.0
+        self.capacity = max(1.0, per_hour / 10)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1  # may go negative: later callers queue behind us
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            metrics.observe("fetch.budget_wait", wait)
+            time.sleep(wait)
+        return wait
+
+
+_BUDGET: Optional[_RequestBudget] = None
+
+
+def configure_fetch(*, max_bytes: Optional[int] = None, content_types: Optional[Iterable[str]] = None,
+                    requests_per_hour: Optional[float] = None) -> None:
+    """
+    Override the download cap / accepted content types (from config `crawl`).
+    requests_per_hour > 0 makes every fetch wait for a slot in that budget;
+    0 turns the budget off again.
+    """
+    global _BUDGET
+    if max_bytes:
+        _FETCH_LIMITS["max_bytes"] = int(max_bytes)
+    if content_types:
+        _FETCH_LIMITS["content_types"] = tuple(t.lower() for t in content_types)
+    if requests_per_hour is not None:
+        _BUDGET = _RequestBudget(float(requests_per_hour)) if requests_per_hour > 0 else None
+
+
+def budget_available() -> Optional[float]:
+    """Requests that can start now without waiting (None when there is no budget)."""
+    return _BUDGET.available() if _BUDGET is not None else None
+
+
+def _read_capped(resp: requests.Response, max_bytes: int) -> Tuple[bytes, bool]:
+    buf = bytearray()
+    for chunk in resp.iter_content(chunk_size=_CHUNK):
+        buf += chunk
+        if len(buf) >= max_bytes:
+            return bytes(buf[:max_bytes]), True
+    return bytes(buf), False
+
+
+def _valid_codec(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def _decode(body: bytes, content_type: str) -> str:
+    """
+    Decode without scanning the whole body: explicit header charset, then a
+    <meta charset> in the first few KB, then BOM / UTF-8, and only then a
+    charset-normalizer guess over a bounded prefix.
+    """
+    m = _HEADER_CHARSET.search(content_type or "")
+    enc = _valid_codec(m.group(1) if m else None)
+    if not enc:
+        m = _META_CHARSET.search(body[:_SNIFF_BYTES])
+        enc = _valid_codec(m.group(1).decode("ascii", "ignore") if m else None)
+    if enc:
+        return body.decode(enc, errors="replace")
+    if body.startswith(codecs.BOM_UTF8):
+        return body[len(codecs.BOM_UTF8):].decode("utf-8", errors="replace")
+    try:
+        # final=False tolerates a multi-byte char cut off by the byte cap
+        return codecs.getincrementaldecoder("utf-8")().decode(body, final=False)
+    except UnicodeDecodeError:
+        pass
+    from charset_normalizer import from_bytes
+    best = from_bytes(body[:_CHUNK]).best()
+    return body.decode(best.encoding if best else "latin-1", errors="replace")
+
+
 def _make_session() -> requests.Session:
     s = requests.Session()
     # Setting a small connection pool; this is a CLI tool.
@@ -34,37 +156,132 @@ def _make_session() -> requests.Session:
     s.mount("https://", adapter)
     return s
 
+_local = threading.local()
+
+def _session() -> requests.Session:
+    # one pooled session per thread so keep-alive connections are reused across paths
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = _make_session()
+    return s
+
+def _get(url: str, h: Dict[str, str], timeout: int, allow_redirects: bool, cap: int):
+    with _session().get(
+        url,
+        headers=h,
+        timeout=timeout,
+        allow_redirects=allow_redirects,
+        stream=True,
+    ) as resp:
+        # Raise for HTTP errors
+        resp.raise_for_status()
+
+        content_type = resp.headers.get("Content-Type", "")
+        mime = content_type.split(";")[0].strip().lower()
+        if mime and mime not in _FETCH_LIMITS["content_types"]:
+            metrics.incr("fetch.skipped")
+            raise FetchSkipped(f"skipped {url}: content type '{mime}'")
+
+        body, truncated = _read_capped(resp, cap)
+        validators = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return body, truncated, content_type, resp.url, [r.status_code for r in resp.history], resp.status_code, validators
+
 def fetch(
     url: str,
     *,
     timeout: int = 20,
     headers: Optional[Dict[str, str]] = None,
     allow_redirects: bool = True,
+    max_bytes: Optional[int] = None,
 ) -> str:
     """
     Fetch the URL and return response text (decoded HTML).
-    Raises requests.HTTPError on non-2xx.
+    The body is streamed and truncated at max_bytes (default from configure_fetch).
+    Known redirects are skipped by requesting the cached final origin directly.
+    Raises requests.HTTPError on non-2xx and FetchSkipped for non-HTML content types.
+    Inside a src.deadline budget the timeout is clamped to the time left.
+
+    With a validator cache and blob store configured, a URL fetched before is
+    requested conditionally and a 304 is answered from the stored copy. With a
+    request budget (configure_fetch), the call first waits for a slot.
     """
-    session = _make_session()
+    if _BUDGET is not None:
+        _BUDGET.acquire()
+    timeout = deadline.clamp(timeout)
     h = dict(DEFAULT_HEADERS)
     if headers:
         h.update(headers)
+    validators, store = httpcache.current(), blobstore.current()
+    conditional = validators.headers_for(url) if validators and store and not headers else {}
+    h.update(conditional)
+    cap = max_bytes or _FETCH_LIMITS["max_bytes"]
+    hosts = hostcache.current()
+    target = hosts.rewrite(url) if hosts and allow_redirects else url
 
-    resp = session.get(
-        url,
-        headers=h,
-        timeout=timeout,
-        allow_redirects=allow_redirects,
-    )
-    # Raise for HTTP errors
-    resp.raise_for_status()
+    try:
+        body, truncated, content_type, final_url, history, status, tags = _get(target, h, timeout, allow_redirects, cap)
+    except (requests.ConnectionError, requests.Timeout):
+        if target == url:
+            raise
+        # cached origin went stale (a 4xx on the new host is just that page's answer); drop it and take the long way once
+        print(f"DEBUG FETCH: cached target {target} failed, retrying {url}")
+        hosts.forget(url)  # type: ignore[union-attr]
+        target = url
+        body, truncated, content_type, final_url, history, status, tags = _get(url, h, timeout, allow_redirects, cap)
+    if hosts and allow_redirects:
+        hosts.learn(target, final_url, history)
+    if history:
+        metrics.incr("fetch.redirected")
 
-    # Use requests' decoding (charset-normalizer) if provided by server,
-    # else fallback to apparent encoding for a best-effort decode.
-    if not resp.encoding:
-        resp.encoding = resp.apparent_encoding
+    metrics.incr("fetch.requests")
+    if status == 304 and conditional:
+        cached = validators.get(url)  # type: ignore[union-attr]
+        html = store.get(cached["blob_id"]) if cached else None  # type: ignore[union-attr]
+        if html is not None:
+            metrics.incr("fetch.not_modified")
+            validators.touch(url)  # type: ignore[union-attr]
+            return html
+        # stored copy is gone; forget the validators and ask again unconditionally
+        validators.forget(url)  # type: ignore[union-attr]
+        return fetch(url, timeout=timeout, allow_redirects=allow_redirects, max_bytes=max_bytes)
 
-    return resp.text
+    metrics.incr("fetch.bytes", len(body))
+    if truncated:
+        metrics.incr("fetch.truncated")
+        print(f"DEBUG FETCH: truncated {url} at {cap} bytes")
+    html = _decode(body, content_type)
+    if validators and store and not headers:
+        # kept even without validators: probe() can still compare bodies
+        validators.learn(url, tags[0], tags[1], store.put(html))
+    return html
+
+
+def probe(url: str, *, timeout: int = 10) -> Optional[bool]:
+    """
+    Has the page at url changed since the stored copy? False for a 304 or an
+    identical body, or a body whose visible text is unchanged; True when the
+    text changed; None if there is nothing to compare with or the fetch fails.
+    """
+    validators, store = httpcache.current(), blobstore.current()
+    before = validators.get(url) if validators else None
+    if before is None or store is None:
+        return None
+    try:
+        html = fetch(url, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"DEBUG FETCH: probe of {url} failed: {e}")
+        return None
+    bid = blobstore.blob_id(html)
+    if bid == before["blob_id"]:
+        return False
+    old = store.get(before["blob_id"])
+    if old is None:
+        return True
+
+    # bytes differ (tokens, timestamps, rotating ads); compare what a reader would see
+    def _fingerprint(page: str) -> str:
+        return hashlib.sha1(extract_text(page).encode("utf-8")).hexdigest()
+    return _fingerprint(html) != _fingerprint(old)
 
 
 def extract_text(html: str) -> str:
@@ -81,24 +298,5 @@ def sentences(text: str):
     return re.split(r"(?<=[.!?])\s+", text)
 
 def extract_date(html: str):
-    soup = BeautifulSoup(html, "lxml")
-    for sel in [
-        ("meta", {"property": "article:published_time"}),
-        ("meta", {"name": "date"}),
-        ("time", {}),
-    ]:
-        el = soup.find(*sel)
-        if el:
-            val = el.get("content") or el.get_text(strip=True)
-            dt = dateparser.parse(val)
-            if dt:
-                return dt
-    m = re.search(
-        r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4}",
-        soup.get_text(" ", strip=True),
-    )
-    if m:
-        dt = dateparser.parse(m.group(0))
-        if dt:
-            return dt
-    return None
+    """Most relevant published date on the page (see src.tools.dates.pick_published)."""
+    return pick_published(extract_dates(html))
@@ -5,7 +5,7 @@ Run with:
 """
 from __future__ import annotations
 
-import json
+import sys
 from pathlib import Path
 from typing import List
 
@@ -13,31 +13,25 @@ import streamlit as st
 import urllib.parse
 
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:  # `streamlit run` only puts src/ui on the path
+    sys.path.insert(0, str(ROOT))
+
+from src.output import read_records  # noqa: E402
 
 
 def find_results() -> Path:
-    candidates = [ROOT / "data" /"results.json",
-                  ROOT / "data" / "results.jsonl"]
+    candidates = [ROOT / "data" / name for name in (
+        "results.json", "results.jsonl", "results.jsonl.zst", "results.jsonl.gz", "results.parquet")]
     for p in candidates:
         if p.exists():
             return p
     return candidates[0]
 
 
-def read_jsonl(path: Path) -> List[dict]:
-    recs: List[dict] = []
-    if not path.exists():
-        return recs
-    with path.open() as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                recs.append(json.loads(line))
-            except Exception:
-                continue
-    return recs
+@st.cache_data
+def load_records(path: str, mtime: float) -> List[dict]:
+    """All records in any output format; cached until the file changes."""
+    return list(read_records(path))
 
 
 def main() -> None:
@@ -49,7 +43,7 @@ def main() -> None:
     st.sidebar.markdown("### Source")
     st.sidebar.write(str(results_path))
 
-    records = read_jsonl(results_path)
+    records = load_records(str(results_path), results_path.stat().st_mtime) if results_path.exists() else []
     if not records:
         st.warning("No records found — falling back to sample data.")
         records = [
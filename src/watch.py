@@ -0,0 +1,128 @@
+# Continuous monitoring: per-domain change history and adaptive revisit intervals
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+__all__ = ["WatchConfig", "WatchState", "card_key"]
+
+
+@dataclass
+class WatchConfig:
+    state: Optional[str] = "data/.watch_state.json"
+    initial_interval_s: float = 86400.0       # first revisit of a newly added domain
+    min_interval_s: float = 6 * 3600.0
+    max_interval_s: float = 14 * 86400.0
+    speedup: float = 0.5                      # interval multiplier after a visit that saw a change
+    backoff: float = 1.5                      # ... and after one that saw nothing new
+    requests_per_hour: float = 600.0          # fetch budget for the whole watcher (probes + runs)
+    poll_s: float = 30.0                      # longest sleep between scheduling passes
+    batch: int = 16                           # domains checked per pass, so cards are written as they come
+
+
+def card_key(card: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Identity of a card for "new or updated" checks: signal, evidence URL and snippet."""
+    if not card:
+        return None
+    raw = f"{card.get('signal_type')}|{card.get('canonical_url')}|{card.get('snippet')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class WatchState:
+    """
+    Per-domain watch record, persisted as JSON: the CSV row, the page URLs the
+    last full run fetched (probed cheaply on the next visit), visit/change/hit
+    counts, the current revisit interval and when the domain is next due.
+
+    The interval shrinks by `speedup` after a visit that found changed pages
+    and grows by `backoff` after one that found none, within [min, max]; it is
+    further scaled by (1 - hit_rate / 2), so domains that keep yielding new
+    cards are revisited up to twice as often.
+    """
+
+    def __init__(self, cfg: WatchConfig):
+        self.cfg = cfg
+        self.path = Path(cfg.state) if cfg.state else None
+        self._lock = threading.Lock()
+        self._domains: Dict[str, Dict[str, Any]] = {}
+        if self.path and self.path.exists():
+            try:
+                self._domains = json.loads(self.path.read_text()).get("domains", {})
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"DEBUG WATCH: ignoring unreadable state {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._domains)
+
+    def add(self, rows: Iterable[Dict[str, str]], now: Optional[float] = None) -> int:
+        """Start watching new domains (due immediately); rows of known domains only refresh the row."""
+        now = now or time.time()
+        added = 0
+        with self._lock:
+            for row in rows:
+                e = self._domains.get(row["domain"])
+                if e is not None:
+                    e["row"] = dict(row)
+                    continue
+                self._domains[row["domain"]] = {
+                    "row": dict(row), "urls": [], "interval_s": self.cfg.initial_interval_s, "next_due": now,
+                    "visits": 0, "changes": 0, "hits": 0, "last_visit": None, "last_change": None, "card_key": None,
+                }
+                added += 1
+        return added
+
+    def entry(self, domain: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._domains[domain])
+
+    def due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        now = now or time.time()
+        with self._lock:
+            ready = sorted((e["next_due"], d) for d, e in self._domains.items() if e["next_due"] <= now)
+        return [d for _, d in ready[:limit]]
+
+    def next_wakeup(self) -> Optional[float]:
+        with self._lock:
+            return min((e["next_due"] for e in self._domains.values()), default=None)
+
+    def record_visit(self, domain: str, *, changed: Optional[bool], new_card: bool = False,
+                     urls: Optional[List[str]] = None, key: Optional[str] = None,
+                     now: Optional[float] = None) -> float:
+        """Update history after a visit and schedule the next one; changed=None (first visit, error) keeps the interval."""
+        now = now or time.time()
+        cfg = self.cfg
+        with self._lock:
+            e = self._domains[domain]
+            e["visits"] += 1
+            e["last_visit"] = now
+            if changed is True:
+                e["changes"] += 1
+                e["last_change"] = now
+                e["interval_s"] = max(cfg.min_interval_s, e["interval_s"] * cfg.speedup)
+            elif changed is False:
+                e["interval_s"] = min(cfg.max_interval_s, e["interval_s"] * cfg.backoff)
+            if new_card:
+                e["hits"] += 1
+            if urls:
+                e["urls"] = list(urls)
+            if key:
+                e["card_key"] = key
+            hit_rate = e["hits"] / e["visits"]
+            delay = max(cfg.min_interval_s, e["interval_s"] * (1 - 0.5 * hit_rate))
+            e["next_due"] = now + delay
+        return delay
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps({"domains": self._domains})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(data)
+        tmp.replace(self.path)
@@ -0,0 +1,149 @@
+# Lease-based work queue on SQLite, shared by worker processes/nodes through a common volume
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY,
+    domain      TEXT NOT NULL UNIQUE,
+    row         TEXT NOT NULL,            -- original CSV row as JSON
+    status      TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    owner       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,
+    error       TEXT,
+    updated     REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, lease_until);
+"""
+
+
+class WorkQueue:
+    """
+    Jobs are claimed in batches under a time-limited lease. Workers heartbeat to
+    extend their leases; a lease that runs out (crashed/stalled node) makes the
+    job claimable again, up to max_attempts. Every method opens its own
+    connection, so one instance can be used from several threads.
+    """
+
+    def __init__(self, path: str, *, max_attempts: int = 3, timeout: float = 60.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        c = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            yield c
+        finally:
+            c.close()
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front so two claimers never pick the same rows
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                yield c
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, rows: Iterable[Dict[str, str]]) -> int:
+        """Add rows keyed by domain; domains already queued are left untouched."""
+        now = time.time()
+        with self._tx() as c:
+            before = c.total_changes
+            c.executemany(
+                "INSERT OR IGNORE INTO jobs(domain, row, updated) VALUES (?, ?, ?)",
+                ((r["domain"], json.dumps(r), now) for r in rows),
+            )
+            return c.total_changes - before
+
+    def claim(self, owner: str, n: int, lease_s: float) -> List[Tuple[int, Dict[str, str]]]:
+        """Lease up to n pending (or lease-expired) jobs to owner."""
+        now = time.time()
+        with self._tx() as c:
+            self._expire(c, now)
+            got = c.execute(
+                "SELECT id, row FROM jobs WHERE status = 'pending' ORDER BY id LIMIT ?", (n,)
+            ).fetchall()
+            c.executemany(
+                "UPDATE jobs SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?",
+                ((owner, now + lease_s, now, jid) for jid, _ in got),
+            )
+        return [(jid, json.loads(row)) for jid, row in got]
+
+    def heartbeat(self, owner: str, job_ids: Iterable[int], lease_s: float) -> int:
+        """Extend owner's leases on job_ids (the jobs still being worked on); returns how many are still held."""
+        now = time.time()
+        with self._tx() as c:
+            cur = c.executemany(
+                "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                ((now + lease_s, now, jid, owner) for jid in job_ids),
+            )
+            return cur.rowcount
+
+    def complete(self, job_id: int, owner: str, record: dict) -> bool:
+        """Store the result; False if the lease was lost and someone else owns the job now."""
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, updated = ? "
+                "WHERE id = ? AND owner = ? AND status = 'leased'",
+                (json.dumps(record), time.time(), job_id, owner),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id: int, owner: str, error: str) -> None:
+        """Release a job after an error; it is retried until max_attempts."""
+        with self._tx() as c:
+            c.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, lease_until = NULL, error = ?, updated = ? "
+                "WHERE id = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error[:2000], time.time(), job_id, owner),
+            )
+
+    def requeue_expired(self) -> int:
+        with self._tx() as c:
+            return self._expire(c, time.time())
+
+    def _expire(self, c: sqlite3.Connection, now: float) -> int:
+        c.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired too many times', owner = NULL "
+            "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, self.max_attempts),
+        )
+        return c.execute(
+            "UPDATE jobs SET status = 'pending', owner = NULL, lease_until = NULL "
+            "WHERE status = 'leased' AND lease_until < ?",
+            (now,),
+        ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._conn() as c:
+            return dict(c.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def results(self) -> Iterator[dict]:
+        """Finished records in enqueue order (failed jobs yield an error record)."""
+        with self._conn() as c:
+            for row, status, result, error in c.execute(
+                "SELECT row, status, result, error FROM jobs WHERE status IN ('done', 'failed') ORDER BY id"
+            ):
+                if status == "done":
+                    yield json.loads(result)
+                else:
+                    r = json.loads(row)
+                    yield {"domain": r["domain"], "company": r.get("company"), "vertical": r.get("vertical"),
+                           "card": None, "email": None, "error": error}